@@ -2,9 +2,13 @@ import cv2
 import numpy as np
 from skimage.metrics import structural_similarity as ssim
 import os
+from functools import lru_cache
 import pytesseract
 from PIL import Image
 
+from config import SSIM_CHANGE_THRESHOLD
+from parallel_compare import comparison_gray
+
 # NEW: Define a cooldown period (in seconds) to prevent typing from being registered as rapid clicks.
 CLICK_COOLDOWN = 2.0 
 
@@ -39,10 +43,12 @@ def track_cursor(frame, cursor_template):
 def detect_significant_change(frame1, frame2):
     """
     Detects significant visual changes between two frames, ignoring cursor movement.
-    This can indicate a click animation or window change.
+    This can indicate a click animation or window change. Frames are compared at
+    the same resolution as parallel_compare.compare_frames, so both paths share
+    SSIM_CHANGE_THRESHOLD.
     """
-    gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
-    gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
+    gray1 = comparison_gray(cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY))
+    gray2 = comparison_gray(cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY))
     
     score, diff = ssim(gray1, gray2, full=True)
     
@@ -52,7 +58,7 @@ def detect_significant_change(frame1, frame2):
     
     # LOWERED THRESHOLD: A lower score means more difference. 
     # This now catches more subtle changes.
-    return score < 0.98
+    return score < SSIM_CHANGE_THRESHOLD
 
 def identify_clicked_element_text(frame, click_pos, search_radius=100):
     """
@@ -89,21 +95,33 @@ def identify_clicked_element_text(frame, click_pos, search_radius=100):
         return "Unknown Element"
 
 
-def process_actions(frame_files, cursor_template_path):
+@lru_cache(maxsize=4)
+def _load_cursor_template(cursor_template_path):
+    """Loads the cursor template once per process; long-running workers reuse it."""
+    return cv2.imread(cursor_template_path, cv2.IMREAD_GRAYSCALE)
+
+def process_actions(frame_store, cursor_template_path, comparisons=None):
     """
     Main function for the action detection module.
+    Reads decoded frames from the shared FrameStore. If comparisons from
+    parallel_compare.compare_frames are given, their SSIM scores are reused
+    instead of recomputing the similarity of every pair.
     """
     print("Processing frames for action detection...")
     events = []
-    cursor_template = cv2.imread(cursor_template_path, cv2.IMREAD_GRAYSCALE)
+    cursor_template = _load_cursor_template(cursor_template_path)
     if cursor_template is None:
         print(f"Warning: Failed to load cursor template from {cursor_template_path}. Cursor tracking disabled.")
 
+    ssim_scores = {}
+    if comparisons is not None:
+        ssim_scores = {(int(row["prev"]), int(row["current"])): float(row["ssim"]) for row in comparisons}
+
     prev_frame = None
     last_event_timestamp = -CLICK_COOLDOWN # Initialize to allow an immediate first event
 
-    for i, frame_path in enumerate(frame_files):
-        frame = cv2.imread(frame_path)
+    for i in range(len(frame_store)):
+        frame = frame_store.get_array(i)
         if frame is None:
             continue
             
@@ -112,7 +130,11 @@ def process_actions(frame_files, cursor_template_path):
         cursor_pos = track_cursor(frame, cursor_template)
         
         if prev_frame is not None:
-            is_change = detect_significant_change(prev_frame, frame)
+            score = ssim_scores.get((i - 1, i))
+            if score is not None:
+                is_change = score < SSIM_CHANGE_THRESHOLD
+            else:
+                is_change = detect_significant_change(prev_frame, frame)
 
             # Only register a change as a click if it's outside the cooldown period
             if is_change and cursor_pos and (timestamp > last_event_timestamp + CLICK_COOLDOWN):
@@ -141,7 +163,7 @@ def process_actions(frame_files, cursor_template_path):
         prev_frame = frame
         
         if i % 20 == 0:
-            print(f"  ...processed action frame {i}/{len(frame_files)}")
+            print(f"  ...processed action frame {i}/{len(frame_store)}")
             
     return events
 
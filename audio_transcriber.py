@@ -5,6 +5,8 @@ import base64
 # --- Configuration ---
 API_KEY = os.getenv("GEMINI_API_KEY")
 MODEL_ENDPOINT = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key={API_KEY}"
+# Reused across calls so a long-running worker keeps its connection warm
+_session = requests.Session()
 
 def transcribe_audio_file(audio_path, output_dir):
     """
@@ -30,7 +32,7 @@ def transcribe_audio_file(audio_path, output_dir):
                                             {"inline_data": {"mime_type": "audio/wav", "data": audio_b64}}]}]
                 }
                 
-                response = requests.post(MODEL_ENDPOINT, json=payload, timeout=120)
+                response = _session.post(MODEL_ENDPOINT, json=payload, timeout=120)
                 response.raise_for_status()
                 response_json = response.json()
                 
@@ -0,0 +1,68 @@
+"""
+Import-time benchmark for the CLI entry point.
+
+Runs each measurement in a fresh interpreter so module caches do not skew the
+numbers, and reports the median over several runs:
+
+    python bench_startup.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Measurements run from the repository root, wherever the script is started from
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules pulled in by the individual stages, measured on their own for comparison
+STAGE_MODULES = ["video_processor", "llm_analyzer", "frame_index", "frame_analysis", "parallel_compare",
+                 "event_processor", "audio_transcriber", "output_formatter", "report_generator"]
+
+def _time_command(command, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, cwd=REPO_DIR)
+        samples.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return None, result.stderr.decode().strip().splitlines()[-1]
+    return statistics.median(samples), None
+
+def _import_time_us(module):
+    """Cumulative import time of a module in microseconds, from -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, cwd=REPO_DIR)
+    if result.returncode != 0:
+        return None
+    for line in reversed(result.stderr.decode().splitlines()):
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    return None
+
+def main(args):
+    print(f"Startup benchmark ({args.runs} runs each, median)\n")
+    for label, command in [
+        ("python main.py --help", [sys.executable, os.path.join(REPO_DIR, "main.py"), "--help"]),
+        ("import main", [sys.executable, "-c", "import main"]),
+        ("interpreter baseline", [sys.executable, "-c", "pass"]),
+    ]:
+        seconds, error = _time_command(command, args.runs)
+        if seconds is None:
+            print(f"  {label:<28} failed: {error}")
+        else:
+            print(f"  {label:<28} {seconds * 1000:8.1f} ms")
+
+    print("\nCumulative import time per stage module (-X importtime):")
+    for module in STAGE_MODULES:
+        micros = _import_time_us(module)
+        status = f"{micros / 1000:8.1f} ms" if micros is not None else "  not importable here"
+        print(f"  {module:<28} {status}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure CLI startup and per-stage import cost.")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs per measurement.")
+    main(parser.parse_args())
@@ -8,9 +8,12 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 VIDEO_INPUT_DIR = os.path.join(BASE_DIR, "video_storage")
 OUTPUT_DIR = os.path.join(BASE_DIR, "output_storage")
 TEMP_DIR = os.path.join(BASE_DIR, "temp")
-os.makedirs(VIDEO_INPUT_DIR, exist_ok=True)
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-os.makedirs(TEMP_DIR, exist_ok=True)
+
+def ensure_directories():
+    """Creates the project directories. Called by entry points, not at import time."""
+    os.makedirs(VIDEO_INPUT_DIR, exist_ok=True)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(TEMP_DIR, exist_ok=True)
 
 # --- Model Configurations ---
 # Note: This model should be fine-tuned on a UI element dataset.
@@ -23,6 +26,9 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "your-openai-api-key-here")
 
 # --- Pipeline Parameters ---
 VIDEO_CHUNK_DURATION_SECONDS = 30 # Duration for video segmentation
+SECONDS_PER_SAMPLE = 2 # Extract one frame every 2 seconds
+JPEG_QUALITY = 95 # Encoding quality of extracted frames (OpenCV's default)
+FRAME_STORE_DECODE_CACHE_SIZE = 16 # Decoded frames kept in memory per frame store
 
 # --- Module 1: Vision Core Parameters ---
 # Cursor Tracking
@@ -37,9 +43,58 @@ OPTICAL_FLOW_ITERATIONS = 3
 OPTICAL_FLOW_POLY_N = 5
 OPTICAL_FLOW_POLY_SIGMA = 1.2
 SCROLL_DOMINANT_FLOW_THRESHOLD = 0.75 # 75% of vectors must be in same direction
+# Local scroll detection (scroll_detection.py); confident scrolls skip the LLM
+LOCAL_SCROLL_DETECTION = True
+SCROLL_DETECTION_WIDTH = 480 # Frames are downscaled to this width before computing flow
+SCROLL_MIN_PHASE_RESPONSE = 0.1 # Phase-correlation peak needed to trust the global shift
+SCROLL_MIN_MOVING_FRACTION = 0.3 # Share of the frame that must move
+SCROLL_ANGLE_TOLERANCE_DEG = 20 # Max deviation of a flow vector from the scroll axis
+SCROLL_MIN_DISTANCE_PX = 20 # Smaller shifts are left to the LLM
+SCROLL_MAX_SHIFT_FRACTION = 0.4 # Larger shifts (share of the frame) may be wrapped and are left to the LLM
 
 # State Change Detection
 PHASH_DISTANCE_THRESHOLD = 5 # Threshold for detecting major frame changes
+SSIM_CHANGE_THRESHOLD = 0.98 # Frames less similar than this (at COMPARE_FRAME_WIDTH) count as a significant change
+# Optional JSON file to persist analyzed frame pairs across sessions.
+# Leave unset to only reuse analyses within a single session.
+PHASH_INDEX_PATH = os.getenv("PHASH_INDEX_PATH")
+
+# --- Parallel Frame Comparison (parallel_compare.py) ---
+PARALLEL_COMPARE_WORKERS = int(os.getenv("PARALLEL_COMPARE_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_COMPARE_WINDOW_FRAMES = 64 # Downscaled frames held in shared memory at once (~15 MB at 640x360)
+COMPARE_FRAME_WIDTH = 640 # Frames are downscaled to this width for SSIM and change boxes
+COMPARE_DIFF_PIXEL_THRESHOLD = 25 # Gray-level difference that marks a pixel as changed
+
+# --- LLM Request Scheduling ---
+# Budgets should match the quota of the API key in use.
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "250000"))
+LLM_MIN_CONCURRENCY = 1
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_INITIAL_CONCURRENCY = 2
+LLM_TARGET_LATENCY_SECONDS = 20 # Back off concurrency when calls get slower than this
+LLM_MAX_RETRIES = 5
+# Used to budget tokens before the API reports actual usage
+LLM_ESTIMATED_TOKENS_PER_IMAGE = 258
+LLM_ESTIMATED_PROMPT_TOKENS = 450
+
+# --- Frame Analysis Mode ---
+# 'linear' analyzes every adjacent frame pair. 'hierarchical' compares frames
+# BISECTION_COARSE_STRIDE samples apart and only bisects intervals that show
+# an action or a large visual change, so sparse sessions need far fewer calls.
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "linear")
+BISECTION_COARSE_STRIDE = 8 # Samples per coarse interval (16 s at 2 s per sample)
+BISECTION_VISUAL_CHANGE_THRESHOLD = 10 # pHash bits; larger changes are always bisected
+
+# --- Pre-flight Estimation (--estimate) ---
+ESTIMATE_SAMPLE_PAIRS = 40 # Frame pairs decoded to predict skip rate and request size
+ESTIMATE_SAMPLE_WINDOWS = 5 # Runs of consecutive pairs the sampled pairs are split into
+ESTIMATE_SECONDS_PER_CALL = 6.0 # Typical latency of one frame-pair request
+
+# --- Worker Service (worker_service.py) ---
+WORKER_HOST = "127.0.0.1"
+WORKER_PORT = int(os.getenv("WORKER_PORT", "8765"))
+WORKER_PARALLEL_JOBS = int(os.getenv("WORKER_PARALLEL_JOBS", "2"))
 
 # --- Module 3: Synthesis Parameters ---
 # Time window in seconds to correlate events during fusion
@@ -0,0 +1,168 @@
+"""
+Pre-flight cost and runtime estimate for a recording (main.py --estimate).
+
+Reads the container metadata with OpenCV and decodes a few short windows of
+consecutive sampled frames, spread evenly over the recording, to predict how
+many pairs the pHash index will skip and how large each request will be.
+Windows are read sequentially like frame extraction does, so their timing
+also predicts the pre-processing time. No LLM calls are made.
+"""
+import json
+import math
+import os
+import time
+
+import cv2
+
+import config
+from frame_index import FramePairIndex, phash_from_gray
+from llm_analyzer import construct_llm_prompt, estimate_request_tokens
+from parallel_compare import has_changed_pixels
+from scroll_detection import detect_scroll
+
+def _read_window(cap, first_sample, samples, frame_interval):
+    """
+    Decodes the sampled frames first_sample .. first_sample + samples - 1 by
+    seeking once and then reading every frame sequentially, as extraction does.
+    Returns (sampled frames, frames read, seconds spent reading).
+    """
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first_sample * frame_interval)
+    frames = []
+    read = 0
+    seconds = 0.0
+    for _ in range((samples - 1) * frame_interval + 1):
+        start = time.perf_counter()
+        ret, frame = cap.read()
+        seconds += time.perf_counter() - start
+        if not ret:
+            break
+        if read % frame_interval == 0:
+            frames.append(frame)
+        read += 1
+    return frames, read, seconds
+
+def _encoded_size(frame):
+    """Size in bytes of the frame as the pipeline would write it."""
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, config.JPEG_QUALITY])
+    return len(buffer) if ok else 0
+
+def _base64_size(raw_size):
+    return 4 * math.ceil(raw_size / 3)
+
+def estimate_video(video_path, sample_pairs=config.ESTIMATE_SAMPLE_PAIRS, windows=config.ESTIMATE_SAMPLE_WINDOWS,
+                   mode=None):
+    """
+    Predicts pair count, skip rate, request bytes, tokens and wall time for a video.
+    Pairs the index reuses, pairs without any pixel change and scrolls the
+    local detector catches are skipped, as in the linear mode. For 'hierarchical' mode the call count is that of
+    the linear mode and the output says so, since how many intervals get
+    bisected depends on the model's answers. Returns a JSON-serializable dict,
+    or None if the video cannot be opened.
+    """
+    mode = mode or config.ANALYSIS_MODE
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video file {video_path}")
+        return None
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    frame_interval = max(1, int(fps * config.SECONDS_PER_SAMPLE))
+    sampled_frames = math.ceil(frame_count / frame_interval) if frame_count else 0
+    total_pairs = max(0, sampled_frames - 1)
+
+    # Short runs of consecutive pairs, spread across the whole recording so
+    # revisited screens show up, matching how the pipeline walks the frames
+    sample_count = min(sample_pairs, total_pairs)
+    window_count = min(max(1, windows), sample_count)
+    window_starts = []
+    if sample_count:
+        window_pairs = math.ceil(sample_count / window_count)
+        step = total_pairs / window_count
+        window_starts = sorted({min(int(i * step), total_pairs - window_pairs) for i in range(window_count)})
+
+    pair_index = FramePairIndex()
+    frame_sizes = []
+    skipped = 0
+    local_scrolls = 0
+    unchanged = 0
+    measured_pairs = 0
+    read_seconds = 0.0
+    frames_read = 0
+    encode_seconds = 0.0
+    for first in window_starts:
+        frames, read, seconds = _read_window(cap, first, window_pairs + 1, frame_interval)
+        frames_read += read
+        read_seconds += seconds
+        grays = []
+        for frame in frames:
+            start = time.perf_counter()
+            frame_sizes.append(_encoded_size(frame))
+            encode_seconds += time.perf_counter() - start
+            grays.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+        hashes = [phash_from_gray(gray) for gray in grays]
+        for i in range(len(grays) - 1):
+            measured_pairs += 1
+            if pair_index.lookup(hashes[i], hashes[i + 1]) is not None:
+                skipped += 1
+            elif not has_changed_pixels(grays[i], grays[i + 1]):
+                unchanged += 1
+            elif config.LOCAL_SCROLL_DETECTION and detect_scroll(grays[i], grays[i + 1]) is not None:
+                local_scrolls += 1
+            else:
+                pair_index.add(hashes[i], hashes[i + 1], {"action": "NONE"})
+    cap.release()
+
+    skip_rate = skipped / measured_pairs if measured_pairs else 0.0
+    unchanged_rate = unchanged / measured_pairs if measured_pairs else 0.0
+    scroll_rate = local_scrolls / measured_pairs if measured_pairs else 0.0
+    api_calls = math.ceil(total_pairs * (1 - skip_rate - unchanged_rate - scroll_rate))
+
+    # Request body: the prompt JSON plus two base64-encoded frames
+    avg_frame_bytes = sum(frame_sizes) / len(frame_sizes) if frame_sizes else 0
+    prompt_bytes = len(json.dumps(construct_llm_prompt("", "")))
+    request_bytes = int(prompt_bytes + 2 * _base64_size(avg_frame_bytes))
+    tokens_per_call = estimate_request_tokens()
+
+    # Sustained calls per minute is capped by whichever budget binds first
+    calls_per_minute = min(
+        config.LLM_REQUESTS_PER_MINUTE,
+        config.LLM_TOKENS_PER_MINUTE / tokens_per_call,
+        config.LLM_MAX_CONCURRENCY * 60.0 / config.ESTIMATE_SECONDS_PER_CALL,
+    )
+    analysis_minutes = api_calls / calls_per_minute if calls_per_minute else 0.0
+    # Frame extraction reads every frame in order and encodes only the sampled ones
+    seconds_per_read = read_seconds / frames_read if frames_read else 0.0
+    seconds_per_encode = encode_seconds / len(frame_sizes) if frame_sizes else 0.0
+    preprocess_minutes = (frame_count * seconds_per_read + sampled_frames * seconds_per_encode) / 60.0
+
+    estimate = {
+        "video": os.path.abspath(video_path),
+        "duration_seconds": round(frame_count / fps, 1),
+        "fps": round(fps, 2),
+        "resolution": [width, height],
+        "sampled_frames": sampled_frames,
+        "frame_pairs": total_pairs,
+        "sampled_windows": len(window_starts),
+        "sampled_pairs_measured": measured_pairs,
+        "analysis_mode": mode,
+        "predicted_skip_rate": round(skip_rate, 3),
+        "predicted_unchanged_rate": round(unchanged_rate, 3),
+        "predicted_local_scroll_rate": round(scroll_rate, 3),
+        "predicted_api_calls": api_calls,
+        "avg_frame_jpeg_bytes": int(avg_frame_bytes),
+        "request_bytes_per_call": request_bytes,
+        "total_upload_bytes": request_bytes * api_calls,
+        "tokens_per_call": tokens_per_call,
+        "total_tokens": tokens_per_call * api_calls,
+        "calls_per_minute": round(calls_per_minute, 1),
+        "estimated_preprocess_minutes": round(preprocess_minutes, 1),
+        "estimated_analysis_minutes": round(analysis_minutes, 1),
+        "estimated_total_minutes": round(preprocess_minutes + analysis_minutes, 1),
+    }
+    if mode == "hierarchical":
+        estimate["note"] = ("API calls, tokens and analysis time assume linear mode. Hierarchical mode makes "
+                            "fewer calls on mostly idle recordings and up to about twice as many on busy ones.")
+    return estimate
@@ -1,5 +1,18 @@
 import re
 
+# --- Merge Rules ---
+# Each event type listed here is merged with immediately following events of
+# the same type. 'window' is the maximum gap in seconds between two events of
+# a run; 'merge' names a strategy in MERGE_STRATEGIES. Event types without a
+# rule are passed through untouched.
+MERGE_RULES = {
+    'TYPE': {'window': 15.0, 'merge': 'concat_text'},
+    'SCROLL': {'window': 6.0, 'merge': 'same_direction'},
+    'CLICK': {'window': 4.0, 'merge': 'same_target'},
+    'PAGE_LOAD': {'window': 6.0, 'merge': 'collapse'},
+}
+
+
 def _clean_typed_text(text):
     """
     A helper function to clean up the concatenated text from the LLM.
@@ -7,69 +20,199 @@ def _clean_typed_text(text):
     """
     # Remove phrases like "Typed '...' into the search input field, changing the text from '...' to '...'"
     # and keep only the final, complete text.
-    match = re.search(r"to '(.*?)'", text)
-    if match:
-        return match.group(1)
-    
+    start = text.find("to '")
+    if start != -1:
+        end = text.find("'", start + 4)
+        if end != -1:
+            return text[start + 4:end]
+
     # Remove simpler prepended phrases
-    text = re.sub(r"^Typed '(.*?)'", r'\1', text)
-    
+    if text.startswith("Typed '"):
+        end = text.find("'", 7)
+        if end != -1:
+            text = text[7:end] + text[end + 1:]
+
     return text.strip()
 
 
+def _normalize_target(value):
+    """Normalizes a click target so trivially different labels compare equal."""
+    return " ".join(str(value or "").lower().split())
+
+
+def _scroll_direction(value):
+    """Returns 'up', 'down', 'left' or 'right' from a scroll description, or None."""
+    match = re.search(r'\b(up|down|left|right)(?:wards?)?\b', str(value or "").lower())
+    return match.group(1) if match else None
+
+
+def _scroll_distance(value):
+    """Returns the pixel distance from a description like 'Scrolled down about 300 px', or None."""
+    match = re.search(r'(\d+)\s*px\b', str(value or "").lower())
+    return int(match.group(1)) if match else None
+
+
+# --- Merge Strategies ---
+# A strategy decides whether an incoming event may join the current run and
+# how a finished run is turned back into a single event. Runs only hold their
+# first and last event plus strategy state (typed fragments for TYPE), never
+# the events themselves, so memory does not grow with the session length.
+
+def _always_merge(run, event):
+    return True
+
+
+def _same_target(run, event):
+    return _normalize_target(run['last'].get('value')) == _normalize_target(event.get('value'))
+
+
+def _same_scroll_direction(run, event):
+    direction = _scroll_direction(run['last'].get('value'))
+    if direction is None:
+        # Without a readable direction only identical descriptions are merged
+        return _normalize_target(run['last'].get('value')) == _normalize_target(event.get('value'))
+    return direction == _scroll_direction(event.get('value'))
+
+
+def _start_scroll(run):
+    run['distance'] = _scroll_distance(run['first'].get('value'))
+
+
+def _extend_scroll(run, event):
+    distance = _scroll_distance(event.get('value'))
+    if run['distance'] is None or distance is None:
+        run['distance'] = None
+    else:
+        run['distance'] += distance
+
+
+def _finalize_scroll(run):
+    """Keeps the first value, or the summed distance when every scroll of the run reported one and a direction."""
+    if run['count'] == 1:
+        return run['first']
+    event = dict(run['first'])
+    event['screenshot'] = run['last'].get('screenshot')
+    direction = _scroll_direction(event.get('value'))
+    # Without a direction the first description is kept as written
+    if run['distance'] is not None and direction is not None:
+        event['value'] = f"Scrolled {direction} about {run['distance']} px"
+    event['mergedCount'] = run['count']
+    return event
+
+
+def _start_text(run):
+    run['fragments'] = [_clean_typed_text(run['first']['value'])]
+
+
+def _extend_text(run, event):
+    run['fragments'].append(_clean_typed_text(event['value']))
+
+
+def _finalize_text(run):
+    return {
+        'timestamp': run['first']['timestamp'],
+        'eventType': run['first']['eventType'],
+        'value': " ".join(run['fragments']).replace('  ', ' ').strip(),
+        # Keep the screenshot of the last typed fragment
+        'screenshot': run['last'].get('screenshot')
+    }
+
+
+def _finalize_collapsed(run):
+    """Keeps the first timestamp and the last (settled) value and screenshot."""
+    if run['count'] == 1:
+        return run['first']
+    event = dict(run['last'])
+    event['timestamp'] = run['first']['timestamp']
+    event['mergedCount'] = run['count']
+    return event
+
+
+MERGE_STRATEGIES = {
+    'concat_text': {'accepts': _always_merge, 'start': _start_text, 'extend': _extend_text, 'finalize': _finalize_text},
+    'same_target': {'accepts': _same_target, 'start': None, 'extend': None, 'finalize': _finalize_collapsed},
+    'same_direction': {'accepts': _same_scroll_direction, 'start': _start_scroll, 'extend': _extend_scroll, 'finalize': _finalize_scroll},
+    'collapse': {'accepts': _always_merge, 'start': None, 'extend': None, 'finalize': _finalize_collapsed},
+}
+
+
+class StreamingConsolidator:
+    """
+    Consolidates events one at a time in a single pass.
+
+    Only the run currently being merged is held in memory. A run is finalized
+    as soon as an event arrives that cannot join it, so consolidated events are
+    returned from push() while the stream is still being produced.
+    """
+
+    def __init__(self, rules=None, strategies=None):
+        self.rules = MERGE_RULES if rules is None else rules
+        self.strategies = MERGE_STRATEGIES if strategies is None else strategies
+        self._run = None
+
+    def _rule_for(self, event):
+        return self.rules.get(str(event.get('eventType', '')).upper())
+
+    def _start_run(self, event, rule):
+        strategy = self.strategies[rule['merge']]
+        self._run = {'rule': rule, 'strategy': strategy, 'first': event, 'last': event, 'count': 1}
+        if strategy['start']:
+            strategy['start'](self._run)
+
+    def _finalize_run(self):
+        run, self._run = self._run, None
+        return run['strategy']['finalize'](run)
+
+    def push(self, event):
+        """Feeds one event and returns the list of events finalized by it."""
+        finalized = []
+        rule = self._rule_for(event)
+        run = self._run
+
+        if run is not None:
+            joins = (
+                rule is run['rule']
+                and event['eventType'] == run['first']['eventType']
+                and event['timestamp'] - run['last']['timestamp'] <= rule['window']
+                and run['strategy']['accepts'](run, event)
+            )
+            if joins:
+                if run['strategy']['extend']:
+                    run['strategy']['extend'](run, event)
+                run['last'] = event
+                run['count'] += 1
+                return finalized
+            finalized.append(self._finalize_run())
+
+        if rule is None:
+            # This event type has no merge rule, emit it directly
+            finalized.append(event)
+        else:
+            self._start_run(event, rule)
+        return finalized
+
+    def flush(self):
+        """Finalizes the pending run, if any. Call once the stream has ended."""
+        if self._run is None:
+            return []
+        return [self._finalize_run()]
+
+
+def consolidate_event_stream(events, rules=None):
+    """Generator form of StreamingConsolidator for any iterable of events."""
+    consolidator = StreamingConsolidator(rules)
+    for event in events:
+        yield from consolidator.push(event)
+    yield from consolidator.flush()
+
+
 def process_and_consolidate_events(raw_events):
     """
-    Takes the raw list of events from the LLM and consolidates consecutive
-    typing events into single, meaningful blocks.
+    Takes the raw list of events from the LLM and consolidates runs of
+    related events (typing, scrolling, repeated clicks, page loads) into
+    single, meaningful blocks according to MERGE_RULES.
     """
     if not raw_events:
         return []
 
-    final_events = []
-    i = 0
-    # A time in seconds. If the gap between typing events is larger than this,
-    # start a new typing block.
-    TYPING_TIME_THRESHOLD = 15.0 
-
-    while i < len(raw_events):
-        current_event = raw_events[i]
-
-        if current_event['eventType'] == 'TYPE':
-            # Start of a potential typing block
-            typing_block = [current_event]
-            j = i + 1
-            while j < len(raw_events):
-                next_event = raw_events[j]
-                time_diff = next_event['timestamp'] - typing_block[-1]['timestamp']
-
-                if next_event['eventType'] == 'TYPE' and time_diff <= TYPING_TIME_THRESHOLD:
-                    typing_block.append(next_event)
-                    j += 1
-                else:
-                    # The typing block has ended
-                    break
-            
-            # Consolidate the typing block into a single event
-            if typing_block:
-                start_timestamp = typing_block[0]['timestamp']
-                # Concatenate all the pieces of text
-                full_text_fragments = [_clean_typed_text(event['value']) for event in typing_block]
-                
-                consolidated_event = {
-                    'timestamp': start_timestamp,
-                    'eventType': 'TYPE',
-                    'value': " ".join(full_text_fragments).replace('  ', ' ').strip(),
-                    # Keep the screenshot of the last typed fragment
-                    'screenshot': typing_block[-1].get('screenshot') 
-                }
-                final_events.append(consolidated_event)
-                i = j # Move the main counter past the processed block
-            else:
-                i += 1
-
-        else:
-            # This is not a typing event, add it directly
-            final_events.append(current_event)
-            i += 1
-            
-    return final_events
+    return list(consolidate_event_stream(raw_events))
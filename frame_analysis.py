@@ -0,0 +1,260 @@
+"""
+Stage 2 orchestration: turns a sequence of sampled frames into raw events.
+
+Frame pairs are looked up in the perceptual-hash index first; the rest are
+sent to the LLM through a RequestScheduler, highest visual change first so
+the pairs most likely to hold report-relevant actions finish earliest.
+Adjacent pairs whose pixels did not change at all (from
+parallel_compare.compare_frames) and pairs that the local optical-flow
+detector confidently labels as scrolls never reach the LLM. Pairs are either every adjacent pair ('linear') or
+chosen by coarse-to-fine bisection ('hierarchical').
+"""
+import threading
+
+import config
+from frame_index import FramePairIndex, hamming_distance, phash_from_gray
+from llm_analyzer import ResponseParseError, estimate_request_tokens, request_frame_analysis
+from request_scheduler import RequestScheduler
+from scroll_detection import detect_scroll, scroll_to_analysis
+
+SECONDS_PER_SAMPLE = config.SECONDS_PER_SAMPLE
+
+# Result for an adjacent pair whose frames are identical at the pixel level
+UNCHANGED_ANALYSIS = {"action": "NONE", "target": "No visible change", "confidence": "High"}
+
+def create_scheduler():
+    """Builds a RequestScheduler from the budgets in config.py."""
+    return RequestScheduler(
+        requests_per_minute=config.LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute=config.LLM_TOKENS_PER_MINUTE,
+        min_concurrency=config.LLM_MIN_CONCURRENCY,
+        max_concurrency=config.LLM_MAX_CONCURRENCY,
+        initial_concurrency=config.LLM_INITIAL_CONCURRENCY,
+        target_latency=config.LLM_TARGET_LATENCY_SECONDS,
+        max_retries=config.LLM_MAX_RETRIES,
+    )
+
+def _pair_priority(prev_hash, current_hash):
+    """Larger visual change between the two frames means an earlier dispatch."""
+    if prev_hash is None or current_hash is None:
+        return 0
+    return -hamming_distance(prev_hash, current_hash)
+
+class _ResponseCounter:
+    """Counts model responses and how many failed schema validation."""
+
+    def __init__(self):
+        self.responses = 0
+        self.parse_failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, parsed):
+        with self._lock:
+            self.responses += 1
+            if not parsed:
+                self.parse_failures += 1
+
+    @property
+    def failure_rate(self):
+        return self.parse_failures / self.responses if self.responses else 0.0
+
+def _make_pair_job(pair_index, counter, frame_store, a, b, prev_hash, current_hash, reusable=True):
+    def job():
+        # Another in-flight pair may have analyzed this screen in the meantime
+        cached = pair_index.lookup(prev_hash, current_hash) if reusable else None
+        if cached is not None:
+            return (cached, True), 0
+        try:
+            result, tokens_used = request_frame_analysis(frame_store.get_bytes(a), frame_store.get_bytes(b))
+        except ResponseParseError:
+            # Raised again so the scheduler re-requests just this pair
+            counter.record(parsed=False)
+            raise
+        counter.record(parsed=True)
+        if reusable:
+            pair_index.add(prev_hash, current_hash, result)
+        return (result, False), tokens_used
+    return job
+
+def _to_raw_event(index, result):
+    return {
+        'timestamp': (index + 1) * SECONDS_PER_SAMPLE,
+        'eventType': result.get('action', 'UNKNOWN').upper(),
+        'value': result.get('target', 'No detail'),
+        'confidence': result.get('confidence')
+    }
+
+class _PairAnalyzer:
+    """Analyzes batches of (earlier, later) frame index pairs via the index and the scheduler."""
+
+    def __init__(self, frame_store, pair_index, scheduler, frame_hashes=None, comparisons=None):
+        self.frames = frame_store
+        if frame_hashes is None:
+            frame_hashes = [phash_from_gray(frame_store.get_array(i, grayscale=True)) for i in range(len(frame_store))]
+        self.hashes = frame_hashes
+        # Pairs in which no pixel changed noticeably; the hashes alone cannot
+        # tell these apart from a keystroke, the pixel comparison can
+        self.unchanged = set()
+        if comparisons is not None:
+            self.unchanged = {(int(row["prev"]), int(row["current"])) for row in comparisons if row["x0"] < 0}
+        self.pair_index = pair_index
+        self.scheduler = scheduler
+        self.counter = _ResponseCounter()
+        self.tokens_per_request = estimate_request_tokens()
+        self.reused_pairs = 0
+        self.requested_pairs = 0
+        self.local_scrolls = 0
+        self.unchanged_pairs = 0
+
+    def visual_distance(self, a, b):
+        if self.hashes[a] is None or self.hashes[b] is None:
+            return None
+        return hamming_distance(self.hashes[a], self.hashes[b])
+
+    def detect_scroll(self, a, b):
+        if not config.LOCAL_SCROLL_DETECTION:
+            return None
+        return detect_scroll(self.frames.get_array(a, grayscale=True), self.frames.get_array(b, grayscale=True))
+
+    def analyze(self, pairs):
+        """
+        Returns ({pair: result}, [failed pairs]) for a batch of pairs. Only
+        adjacent pairs go through the index: a coarse interval spans several
+        samples, so its result is not interchangeable with one of an adjacent pair.
+        """
+        results = {}
+        futures = {}
+        for a, b in pairs:
+            adjacent = b - a == 1
+            cached = self.pair_index.lookup(self.hashes[a], self.hashes[b]) if adjacent else None
+            if cached is not None:
+                results[(a, b)] = cached
+                self.reused_pairs += 1
+                continue
+            if adjacent and (a, b) in self.unchanged:
+                results[(a, b)] = UNCHANGED_ANALYSIS
+                self.unchanged_pairs += 1
+                continue
+            scroll = self.detect_scroll(a, b)
+            if scroll is not None:
+                results[(a, b)] = scroll_to_analysis(scroll)
+                self.local_scrolls += 1
+                continue
+            job = _make_pair_job(self.pair_index, self.counter, self.frames, a, b,
+                                 self.hashes[a], self.hashes[b], reusable=adjacent)
+            futures[(a, b)] = self.scheduler.submit(job, priority=_pair_priority(self.hashes[a], self.hashes[b]),
+                                                    tokens=self.tokens_per_request)
+
+        # A job may still find its pair in the index, so a pair only counts
+        # as requested once its job has actually called the LLM
+        failed = []
+        for (a, b), future in futures.items():
+            try:
+                result, reused = future.result()
+            except Exception as e:
+                print(f"  [LLM Error] Frames {a} and {b} could not be analyzed: {e}")
+                self.requested_pairs += 1
+                failed.append((a, b))
+                continue
+            if reused:
+                self.reused_pairs += 1
+            else:
+                self.requested_pairs += 1
+            results[(a, b)] = result
+        return results, failed
+
+def _analyze_linear(analyzer, frame_count):
+    """Every adjacent pair is analyzed."""
+    pairs = [(i, i + 1) for i in range(frame_count - 1)]
+    results, failed = analyzer.analyze(pairs)
+    print(f"  -> {analyzer.reused_pairs} pairs matched already-analyzed screens, "
+          f"{analyzer.requested_pairs} sent to the LLM.")
+    return {a: result for (a, b), result in results.items()}, [a for a, b in failed]
+
+def _interval_is_active(analyzer, a, b, result):
+    """Whether a coarse interval may hide actions and needs to be split further."""
+    if result is None:
+        # The comparison failed; only a finer pass can tell
+        return True
+    if result.get('action') != 'NONE':
+        return True
+    distance = analyzer.visual_distance(a, b)
+    return distance is None or distance > config.BISECTION_VISUAL_CHANGE_THRESHOLD
+
+def _analyze_hierarchical(analyzer, frame_count, stride):
+    """
+    Coarse-to-fine bisection. Frames `stride` samples apart are compared
+    first; only intervals that report an action or a large visual change are
+    split in half, level by level, down to adjacent pairs. Only adjacent pairs
+    produce events, so timestamps match the linear mode exactly.
+    """
+    last = frame_count - 1
+    intervals = [(a, min(a + stride, last)) for a in range(0, last, stride)]
+    leaf_results = {}
+    failed_pairs = []
+    level = 0
+    while intervals:
+        results, failed = analyzer.analyze(intervals)
+        failed = set(failed)
+        next_intervals = []
+        for a, b in intervals:
+            result = results.get((a, b))
+            if b - a == 1:
+                if (a, b) in failed:
+                    failed_pairs.append(a)
+                elif result is not None:
+                    leaf_results[a] = result
+            elif _interval_is_active(analyzer, a, b, result):
+                mid = (a + b) // 2
+                next_intervals.extend([(a, mid), (mid, b)])
+        print(f"  -> Level {level}: compared {len(intervals)} intervals, {len(next_intervals) // 2} need a closer look.")
+        intervals = next_intervals
+        level += 1
+    print(f"  -> {analyzer.requested_pairs} comparisons sent to the LLM for {last} adjacent pairs "
+          f"({analyzer.reused_pairs} reused).")
+    return leaf_results, sorted(failed_pairs)
+
+def analyze_frame_sequence(frame_store, pair_index=None, scheduler=None, mode=None, frame_hashes=None,
+                           comparisons=None):
+    """
+    Turns the sampled frames of a FrameStore into raw events. mode is
+    'linear' (every adjacent pair) or 'hierarchical' (coarse-to-fine
+    bisection), defaulting to config.ANALYSIS_MODE. frame_hashes and
+    comparisons may carry the output of parallel_compare.compare_frames.
+    Returns (raw_events, stats); raw_events are in timestamp order and have
+    the same schema in both modes.
+    """
+    mode = mode or config.ANALYSIS_MODE
+    if mode not in ("linear", "hierarchical"):
+        raise ValueError(f"Unknown analysis mode '{mode}'. Use 'linear' or 'hierarchical'.")
+    if pair_index is None:
+        pair_index = FramePairIndex.load(config.PHASH_INDEX_PATH)
+    owns_scheduler = scheduler is None
+    if owns_scheduler:
+        scheduler = create_scheduler()
+
+    analyzer = _PairAnalyzer(frame_store, pair_index, scheduler, frame_hashes, comparisons)
+    frame_count = len(frame_store)
+    if frame_count < 2:
+        results, failed_pairs = {}, []
+    elif mode == "hierarchical":
+        results, failed_pairs = _analyze_hierarchical(analyzer, frame_count, max(1, config.BISECTION_COARSE_STRIDE))
+    else:
+        results, failed_pairs = _analyze_linear(analyzer, frame_count)
+    if owns_scheduler:
+        scheduler.close()
+
+    raw_events = []
+    for i in sorted(results):
+        result = results[i]
+        if result and result.get('action') != 'NONE':
+            raw_events.append(_to_raw_event(i, result))
+
+    counter = analyzer.counter
+    stats = dict(scheduler.stats, mode=mode, reused_pairs=analyzer.reused_pairs,
+                 requested_pairs=analyzer.requested_pairs, local_scrolls=analyzer.local_scrolls,
+                 unchanged_pairs=analyzer.unchanged_pairs,
+                 failed_pairs=failed_pairs,
+                 responses=counter.responses, parse_failures=counter.parse_failures,
+                 parse_failure_rate=counter.failure_rate)
+    return raw_events, stats
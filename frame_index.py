@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from config import PHASH_DISTANCE_THRESHOLD
+
+# Actions whose analysis can safely be reused for a visually similar pair.
+# TYPE is excluded: the typed characters are a tiny part of the frame, so two
+# pairs can be perceptually identical while carrying different text.
+REUSABLE_ACTIONS = {"CLICK", "SCROLL", "PAGE_LOAD", "NONE"}
+
+def compute_phash(image_path):
+    """
+    Computes a 64-bit perceptual hash (DCT based) of an image file.
+    Returns None if the image cannot be read.
+    """
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    return phash_from_gray(image)
+
+def phash_from_gray(gray):
+    """Computes the 64-bit pHash of a grayscale NumPy image."""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    dct = cv2.dct(small)[:8, :8]
+    # The DC term only carries overall brightness, so leave it out of the median
+    median = np.median(dct.flatten()[1:])
+    bits = (dct > median).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+def hamming_distance(a, b):
+    """Number of differing bits between two integer hashes."""
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    A Burkhard-Keller tree over integer hashes using Hamming distance.
+    Lookups within a small radius only visit a fraction of the stored keys.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, key, value):
+        node = [key, value, {}]
+        self._size += 1
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming_distance(key, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, key, radius):
+        """Returns a list of (distance, key, value) within radius of key."""
+        if self._root is None:
+            return []
+        matches = []
+        stack = [self._root]
+        while stack:
+            node_key, node_value, children = stack.pop()
+            distance = hamming_distance(key, node_key)
+            if distance <= radius:
+                matches.append((distance, node_key, node_value))
+            # Triangle inequality: only children in this band can be within radius
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return matches
+
+    def items(self):
+        """Yields every stored (key, value) pair."""
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            key, value, children = stack.pop()
+            yield key, value
+            stack.extend(children.values())
+
+
+class FramePairIndex:
+    """
+    Index of already-analyzed frame pairs keyed on their pHashes.
+
+    A pair is stored as the 128-bit concatenation of its two 64-bit hashes, so
+    the Hamming distance between two keys is the sum of the per-frame distances.
+    A lookup matches only when both frames are within the threshold and the
+    change inside the pair is about as large as in the stored pair. Pairs
+    whose own change is at or below the threshold are neither stored nor
+    answered: the hashes cannot tell their two frames apart, so a keystroke or
+    a ticked checkbox would look exactly like an idle pair.
+    """
+
+    def __init__(self, threshold=PHASH_DISTANCE_THRESHOLD):
+        self.threshold = threshold
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tree)
+
+    @staticmethod
+    def _pair_key(prev_hash, current_hash):
+        return (prev_hash << 64) | current_hash
+
+    def lookup(self, prev_hash, current_hash):
+        """Returns the stored analysis of the closest similar pair, or None."""
+        if prev_hash is None or current_hash is None:
+            return None
+        change = hamming_distance(prev_hash, current_hash)
+        if change <= self.threshold:
+            return None
+        key = self._pair_key(prev_hash, current_hash)
+        with self._lock:
+            matches = self._tree.search(key, 2 * self.threshold)
+        best = None
+        for distance, match_key, result in matches:
+            match_prev, match_current = match_key >> 64, match_key & ((1 << 64) - 1)
+            if hamming_distance(match_prev, prev_hash) > self.threshold:
+                continue
+            if hamming_distance(match_current, current_hash) > self.threshold:
+                continue
+            if abs(hamming_distance(match_prev, match_current) - change) > self.threshold:
+                continue
+            if best is None or distance < best[0]:
+                best = (distance, result)
+        return best[1] if best else None
+
+    def add(self, prev_hash, current_hash, result):
+        """Stores an analysis result if it is safe to reuse."""
+        if prev_hash is None or current_hash is None or not result:
+            return
+        if str(result.get("action", "")).upper() not in REUSABLE_ACTIONS:
+            return
+        if hamming_distance(prev_hash, current_hash) <= self.threshold:
+            return
+        with self._lock:
+            self._tree.add(self._pair_key(prev_hash, current_hash), result)
+
+    @classmethod
+    def load(cls, path, threshold=PHASH_DISTANCE_THRESHOLD):
+        """Loads a persisted index for cross-session reuse. A missing file gives an empty index."""
+        index = cls(threshold)
+        if not path or not os.path.exists(path):
+            return index
+        try:
+            with open(path, "r") as f:
+                entries = json.load(f)
+            for entry in entries:
+                index.add(int(entry["prev"], 16), int(entry["current"], 16), entry["result"])
+            print(f"Loaded {len(index)} analyzed frame pairs from {path}")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Could not load frame pair index from {path}. Reason: {e}")
+        return index
+
+    def save(self, path):
+        """Persists the index so later sessions can reuse its analyses."""
+        if not path:
+            return
+        entries = []
+        with self._lock:
+            for key, result in self._tree.items():
+                entries.append({"prev": f"{key >> 64:016x}", "current": f"{key & ((1 << 64) - 1):016x}", "result": result})
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # Write then rename, so concurrent jobs never leave a half-written file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not save frame pair index to {path}. Reason: {e}")
@@ -0,0 +1,121 @@
+"""
+Packed, memory-mapped store for the sampled frames.
+
+All sampled frames are written JPEG-encoded into a single pack file with an
+offset index next to it, instead of one file per frame. Readers memory-map
+the pack: encoded bytes are returned as zero-copy memoryviews (ready to be
+base64-encoded for the API or written out as a screenshot) and recently
+decoded arrays are cached, so stages sharing one store do not re-open or
+re-decode the same frame over and over.
+"""
+import mmap
+import os
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from config import FRAME_STORE_DECODE_CACHE_SIZE, JPEG_QUALITY
+
+PACK_FILENAME = "frames.pack"
+INDEX_FILENAME = "frames.index.npy"
+
+
+class FrameStoreWriter:
+    """Appends frames to a pack file. Call close() (or use as a context manager) to write the index."""
+
+    def __init__(self, directory, jpeg_quality=JPEG_QUALITY):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.jpeg_quality = jpeg_quality
+        self._pack = open(os.path.join(directory, PACK_FILENAME), "wb")
+        self._entries = []
+        self._offset = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def append(self, frame):
+        """Encodes a BGR frame and appends it. Returns the frame's index."""
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("Failed to JPEG-encode frame.")
+        data = buffer.tobytes()
+        self._pack.write(data)
+        self._entries.append((self._offset, len(data)))
+        self._offset += len(data)
+        return len(self._entries) - 1
+
+    def close(self):
+        if self._pack.closed:
+            return
+        self._pack.close()
+        np.save(os.path.join(self.directory, INDEX_FILENAME), np.array(self._entries, dtype=np.int64).reshape(-1, 2))
+
+
+class FrameStore:
+    """Read-only, memory-mapped view of a pack written by FrameStoreWriter."""
+
+    def __init__(self, directory, cache_size=FRAME_STORE_DECODE_CACHE_SIZE):
+        self.directory = directory
+        self._index = np.load(os.path.join(directory, INDEX_FILENAME))
+        self._file = open(os.path.join(directory, PACK_FILENAME), "rb")
+        # mmap cannot map an empty file
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if len(self._index) else None
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+
+    @staticmethod
+    def exists(directory):
+        return os.path.exists(os.path.join(directory, INDEX_FILENAME))
+
+    def __len__(self):
+        return len(self._index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get_bytes(self, i):
+        """Zero-copy memoryview of frame i's JPEG bytes."""
+        offset, length = self._index[i]
+        return memoryview(self._map)[offset:offset + length]
+
+    def get_array(self, i, grayscale=False):
+        """Decoded frame i (BGR, or single-channel when grayscale). Results are cached; do not modify them."""
+        key = (i, grayscale)
+        frame = self._cache.get(key)
+        if frame is not None:
+            self._cache.move_to_end(key)
+            return frame
+        flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+        frame = cv2.imdecode(np.frombuffer(self.get_bytes(i), dtype=np.uint8), flags)
+        self._cache[key] = frame
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return frame
+
+    def export_jpeg(self, i, dest_path):
+        """Writes frame i to dest_path as a JPEG without re-encoding it."""
+        with open(dest_path, "wb") as f:
+            f.write(self.get_bytes(i))
+        return dest_path
+
+    def close(self):
+        self._cache.clear()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A caller still holds a view from get_bytes(); the map is released with it
+                pass
+            self._map = None
+        self._file.close()
@@ -4,16 +4,73 @@ import json
 import requests
 import time
 import random
+from dataclasses import asdict, dataclass
+
+import config
+from request_scheduler import RateLimitError, TransientRequestError
 
 # --- Configuration ---
 API_KEY = os.getenv("GEMINI_API_KEY")
 MODEL_ENDPOINT = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key={API_KEY}"
-MAX_RETRIES = 5
+MAX_RETRIES = config.LLM_MAX_RETRIES
+
+# One pooled session so concurrent requests reuse connections
+_session = requests.Session()
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=config.LLM_MAX_CONCURRENCY))
+
+ACTIONS = ("CLICK", "TYPE", "SCROLL", "PAGE_LOAD", "NONE")
+CONFIDENCE_LEVELS = ("High", "Medium", "Low")
+
+# Gemini response schema; the API then only returns JSON matching it
+FRAME_ANALYSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "action": {"type": "STRING", "enum": list(ACTIONS)},
+        "target": {"type": "STRING"},
+        "confidence": {"type": "STRING", "enum": list(CONFIDENCE_LEVELS)},
+    },
+    "required": ["action", "target", "confidence"],
+    "propertyOrdering": ["action", "target", "confidence"],
+}
+
+class LLMRequestError(Exception):
+    """A request failed in a way that retrying will not fix."""
+
+class ResponseParseError(TransientRequestError):
+    """The model's output did not match FRAME_ANALYSIS_SCHEMA. Retrying the pair usually fixes it."""
+    retry_after = 0.0
+
+@dataclass(frozen=True)
+class FrameAnalysis:
+    """A validated frame-pair analysis."""
+    action: str
+    target: str
+    confidence: str
 
-def encode_image_to_base64(image_path):
-    """Encodes an image file to a base64 string."""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            raise ResponseParseError(f"Expected a JSON object, got {type(data).__name__}.")
+        action = str(data.get("action", "")).strip().upper()
+        if action not in ACTIONS:
+            raise ResponseParseError(f"Unknown action {data.get('action')!r}.")
+        confidence = str(data.get("confidence", "")).strip().capitalize()
+        if confidence not in CONFIDENCE_LEVELS:
+            raise ResponseParseError(f"Unknown confidence {data.get('confidence')!r}.")
+        target = data.get("target")
+        if not isinstance(target, str):
+            raise ResponseParseError("Missing or non-string target.")
+        return cls(action, target.strip(), confidence)
+
+    def to_dict(self):
+        return asdict(self)
+
+def encode_image_to_base64(image):
+    """Encodes an image file path, or already-encoded image bytes (e.g. from a FrameStore), to a base64 string."""
+    if isinstance(image, str):
+        with open(image, "rb") as image_file:
+            image = image_file.read()
+    return base64.b64encode(image).decode('utf-8')
 
 def construct_llm_prompt(prev_frame_b64, current_frame_b64):
     """
@@ -49,65 +106,96 @@ def construct_llm_prompt(prev_frame_b64, current_frame_b64):
                     {"inline_data": {"mime_type": "image/jpeg", "data": current_frame_b64}}
                 ]
             }
-        ]
+        ],
+        "generationConfig": {
+            "responseMimeType": "application/json",
+            "responseSchema": FRAME_ANALYSIS_SCHEMA
+        }
     }
 
-def clean_llm_response(response_text):
-    """Cleans and parses the LLM's JSON response, handling potential formatting issues."""
-    if not response_text: return None
-    # Find the start and end of the JSON blob
-    start = response_text.find('{')
-    end = response_text.rfind('}') + 1
-    if start == -1 or end == 0:
-        return None
-    
-    json_str = response_text[start:end]
+def parse_frame_analysis(response_text):
+    """
+    Parses and validates the model's structured JSON output.
+    Raises ResponseParseError when the output does not match the schema.
+    """
+    if not response_text:
+        raise ResponseParseError("Empty response text.")
     try:
-        return json.loads(json_str)
-    except json.JSONDecodeError:
-        print(f"  [LLM Error] Failed to decode JSON from response: {json_str}")
-        return None
+        data = json.loads(response_text)
+    except json.JSONDecodeError as e:
+        raise ResponseParseError(f"Failed to decode JSON from response: {response_text[:200]}") from e
+    return FrameAnalysis.from_dict(data)
 
-def analyze_frames_with_llm(prev_frame_path, current_frame_path):
+def estimate_request_tokens():
+    """Rough token cost of one frame-pair request, used to budget tokens-per-minute."""
+    return 2 * config.LLM_ESTIMATED_TOKENS_PER_IMAGE + config.LLM_ESTIMATED_PROMPT_TOKENS
+
+def request_frame_analysis(prev_frame, current_frame):
     """
-    Sends a pair of frames to the LLM for analysis and returns the structured result.
-    Includes exponential backoff to handle rate limiting.
+    Sends a pair of frames (file paths or JPEG bytes) to the LLM once, without retrying.
+    Returns (result, total_tokens) where result is a validated FrameAnalysis
+    as a dict. Raises RateLimitError or TransientRequestError (including
+    ResponseParseError) for retryable failures and LLMRequestError otherwise.
     """
     if not API_KEY:
-        print("\n[FATAL ERROR] GEMINI_API_KEY environment variable not set.")
-        return None
+        raise LLMRequestError("GEMINI_API_KEY environment variable not set.")
+
+    prev_frame_b64 = encode_image_to_base64(prev_frame)
+    current_frame_b64 = encode_image_to_base64(current_frame)
 
-    prev_frame_b64 = encode_image_to_base64(prev_frame_path)
-    current_frame_b64 = encode_image_to_base64(current_frame_path)
-    
     payload = construct_llm_prompt(prev_frame_b64, current_frame_b64)
-    
+
+    try:
+        response = _session.post(MODEL_ENDPOINT, json=payload, timeout=60)
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+        raise TransientRequestError(f"API request failed: {e}") from e
+    except requests.exceptions.RequestException as e:
+        raise LLMRequestError(f"API request failed: {e}") from e
+
+    if response.status_code == 429:
+        retry_after = response.headers.get("Retry-After")
+        raise RateLimitError("Rate limited (HTTP 429).",
+                             retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+    if response.status_code >= 500:
+        raise TransientRequestError(f"HTTP {response.status_code} from API.")
+    if response.status_code >= 400:
+        raise LLMRequestError(f"HTTP request failed with status {response.status_code}: {response.text[:200]}")
+
+    try:
+        response_json = response.json()
+    except ValueError as e:
+        raise ResponseParseError(f"Response body is not valid JSON: {response.text[:200]}") from e
+    total_tokens = response_json.get('usageMetadata', {}).get('totalTokenCount')
+
+    if 'candidates' in response_json and response_json['candidates']:
+        content = response_json['candidates'][0].get('content', {})
+        if 'parts' in content and content['parts']:
+            raw_text = content['parts'][0].get('text', '')
+            try:
+                return parse_frame_analysis(raw_text).to_dict(), total_tokens
+            except ResponseParseError as e:
+                # The malformed response was still billed
+                e.tokens_used = total_tokens
+                raise
+
+    raise LLMRequestError(f"Unexpected API response format: {response_json}")
+
+def analyze_frames_with_llm(prev_frame_path, current_frame_path):
+    """
+    Sends a pair of frames to the LLM for analysis and returns the structured result.
+    Standalone helper with its own exponential backoff; the pipeline schedules
+    request_frame_analysis through a RequestScheduler instead.
+    """
     for attempt in range(MAX_RETRIES):
         try:
-            response = requests.post(MODEL_ENDPOINT, json=payload, timeout=60)
-            response.raise_for_status()
-            
-            response_json = response.json()
-            
-            if 'candidates' in response_json and response_json['candidates']:
-                content = response_json['candidates'][0].get('content', {})
-                if 'parts' in content and content['parts']:
-                    raw_text = content['parts'][0].get('text', '')
-                    return clean_llm_response(raw_text)
-            
-            print(f"  [LLM Error] Unexpected API response format: {response_json}")
-            return None
-
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:
-                wait_time = (2 ** attempt) + random.uniform(0, 1)
-                print(f"    [API Limit Reached] Rate limited. Waiting for {wait_time:.2f} seconds before retrying...")
-                time.sleep(wait_time)
-            else:
-                print(f"  [LLM Error] HTTP request failed with status {e.response.status_code}: {e}")
-                return None
-        except requests.exceptions.RequestException as e:
-            print(f"  [LLM Error] API request failed: {e}")
+            result, _ = request_frame_analysis(prev_frame_path, current_frame_path)
+            return result
+        except (RateLimitError, TransientRequestError) as e:
+            wait_time = (2 ** attempt) + random.uniform(0, 1)
+            print(f"    [API Warning] {e} Waiting for {wait_time:.2f} seconds before retrying...")
+            time.sleep(wait_time)
+        except LLMRequestError as e:
+            print(f"  [LLM Error] {e}")
             return None
 
     print(f"  [LLM Error] API call failed after {MAX_RETRIES} retries. Halting.")
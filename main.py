@@ -4,85 +4,83 @@ import time
 import shutil
 import json
 
-from video_processor import preprocess_video
-from llm_analyzer import analyze_frames_with_llm
-from event_processor import process_and_consolidate_events
-from audio_transcriber import transcribe_audio_file
-from report_generator import generate_step_by_step_report
-from nl_generation import generate_narrative
-from output_formatter import format_and_save_output
+import config
+from stages import STAGES, close_resources, parse_stage_list, run_stages
 
-def main(args):
+def run_pipeline(video, output_dir=None, stages="all", analysis_mode=None, keep_temp_files=False, shared=None):
+    """
+    Runs the selected stages for one video and returns the stage context.
+    shared may hold long-lived resources (e.g. 'pair_index', 'scheduler')
+    that a long-running caller reuses across videos.
+    """
     start_time = time.time()
     print("Starting Project SessionReplay analysis...")
+    config.ensure_directories()
 
-    # Setup output directory
-    video_name = os.path.splitext(os.path.basename(args.video))[0]
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
-    output_dir = os.path.join("output", f"{video_name}_{timestamp}")
-    os.makedirs(output_dir, exist_ok=True)
-    print(f"Created output directory: {output_dir}\n")
-
-    # --- Stage 1: Pre-processing ---
-    print("--- Stage 1: Pre-processing Video ---")
-    frame_dir, audio_path, total_frames, sampled_frame_files = preprocess_video(args.video, output_dir)
-    print("Video pre-processing complete.\n")
-    
-    # --- Stage 2: Visual Analysis ---
-    print("--- Stage 2: Analyzing Frames with Multimodal LLM ---")
-    raw_events = []
-    SECONDS_PER_SAMPLE = 2
-    for i in range(len(sampled_frame_files) - 1):
-        prev_frame = sampled_frame_files[i]
-        current_frame = sampled_frame_files[i+1]
-        print(f"  -> Analyzing frames {i} and {i+1}...")
-        result = analyze_frames_with_llm(prev_frame, current_frame)
-        if result and result.get('action') != 'NONE':
-            current_timestamp = (i + 1) * SECONDS_PER_SAMPLE
-            raw_events.append({
-                'timestamp': current_timestamp,
-                'eventType': result.get('action', 'UNKNOWN').upper(),
-                'value': result.get('target', 'No detail')
-            })
-    print(f"LLM analysis complete. Found {len(raw_events)} raw events.\n")
+    stage_names = parse_stage_list(stages)
 
-    # --- Stage 3: Event Consolidation ---
-    print("--- Stage 3: Consolidating Events ---")
-    final_events = process_and_consolidate_events(raw_events)
-    print(f"Consolidated into {len(final_events)} final events.\n")
-
-    # --- Stage 4: Audio Transcription ---
-    print("--- Stage 4: Transcribing Audio ---")
-    # The function now handles saving the file internally
-    transcription = transcribe_audio_file(audio_path, output_dir)
-    print("Audio transcription complete.\n")
+    # Setup output directory. Re-using an existing one lets later stages
+    # run from the artifacts of an earlier run.
+    if not output_dir:
+        video_name = os.path.splitext(os.path.basename(video))[0]
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        output_dir = os.path.join("output", f"{video_name}_{timestamp}")
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"Using output directory: {output_dir}\n")
 
-    # --- Stage 5: Final Output Formatting ---
-    print("--- Stage 5: Formatting Final JSON Logs ---")
-    final_events_with_narrative = generate_narrative(final_events)
-    format_and_save_output(raw_events, final_events_with_narrative, output_dir, sampled_frame_files)
-    print("JSON logs and screenshots saved.\n")
-    
-    # --- Stage 6: Step-by-Step Report Generation ---
-    print("--- Stage 6: Generating Final Report ---")
-    generate_step_by_step_report(final_events_with_narrative, transcription, output_dir)
-    print("Report generation complete.\n")
+    context = dict(shared or {}, video=video, output_dir=output_dir, analysis_mode=analysis_mode)
+    try:
+        run_stages(stage_names, context)
+    finally:
+        close_resources(context)
 
     # --- Cleanup ---
-    if not args.keep_temp_files:
-        shutil.rmtree(os.path.join(output_dir, "temp"))
-        print("Temporary files cleaned up.")
-    else:
+    # Frames and audio are only removed once the last stage has run, so a
+    # partial run can be resumed from the same output directory
+    temp_dir = os.path.join(output_dir, "temp")
+    if keep_temp_files:
         print("Temporary files kept for debugging purposes.")
+    elif list(STAGES)[-1] not in stage_names:
+        print(f"Temporary files kept for the remaining stages in {temp_dir}.")
+    elif os.path.isdir(temp_dir):
+        shutil.rmtree(temp_dir)
+        print("Temporary files cleaned up.")
 
     end_time = time.time()
     print(f"Analysis complete in {end_time - start_time:.2f} seconds.")
+    return context
+
+def main(args):
+    if args.estimate:
+        from estimator import estimate_video
+
+        estimate = estimate_video(args.video, mode=args.analysis_mode)
+        print(json.dumps(estimate, indent=2))
+        return estimate
+
+    return run_pipeline(args.video, output_dir=args.output_dir, stages=args.stages,
+                        analysis_mode=args.analysis_mode, keep_temp_files=args.keep_temp_files)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Analyze a screen recording to generate a session log.")
-    parser.add_argument("--video", required=True, help="Path to the video file to analyze.")
+    parser.add_argument("--video", help="Path to the video file to analyze.")
     parser.add_argument("--keep-temp-files", action='store_true', help="Keep temporary frames and audio for debugging.")
+    parser.add_argument("--stages", default="all",
+                        help=f"Comma-separated subset of stages to run ({', '.join(STAGES)}). Defaults to all.")
+    parser.add_argument("--output-dir", help="Existing output directory to reuse, e.g. to re-run only the 'report' stage.")
+    parser.add_argument("--analysis-mode", choices=["linear", "hierarchical"],
+                        help="Frame analysis strategy. 'hierarchical' bisects coarse intervals only where actions occur. "
+                             "Defaults to ANALYSIS_MODE in config.py.")
+    parser.add_argument("--estimate", action='store_true',
+                        help="Print predicted API calls, upload bytes, tokens and runtime as JSON without calling the LLM.")
     args = parser.parse_args()
+    if args.estimate and not args.video:
+        parser.error("--estimate requires --video.")
+    try:
+        stage_names = parse_stage_list(args.stages)
+    except ValueError as e:
+        parser.error(str(e))
+    if not args.video and (not args.output_dir or "preprocess" in stage_names):
+        parser.error("--video is required unless --output-dir is given and 'preprocess' is not among --stages.")
     main(args)
-
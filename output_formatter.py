@@ -1,6 +1,7 @@
 import json
 import os
-import shutil
+
+from config import SECONDS_PER_SAMPLE
 
 def _save_log_to_json(events, filepath):
     """Internal function to save an event log to a JSON file."""
@@ -12,31 +13,29 @@ def _save_log_to_json(events, filepath):
         print(f"Error: Failed to save JSON log to {filepath}. Reason: {e}")
         return False
 
-def _save_event_screenshots(events, output_dir, frame_files):
+def _save_event_screenshots(events, output_dir, frame_store):
     """
-    Internal function to copy the relevant frame as a screenshot for each key event.
+    Internal function to export the relevant frame from the FrameStore as a
+    screenshot for each key event. Only these frames are ever written as JPEGs.
     """
     screenshots_dir = os.path.join(output_dir, "screenshots")
     os.makedirs(screenshots_dir, exist_ok=True)
     
     print("Saving screenshots for key events...")
-    
-    SECONDS_PER_SAMPLE = 2 # Should match other modules
 
     for event in events:
         # Use a get call to avoid errors if screenshot is already set (like in consolidated events)
         if event.get('screenshot'):
             # This event already has a screenshot path, likely from consolidation.
-            # We just need to ensure the source file exists and copy it.
+            # We just need to export that frame from the store.
             source_filename = os.path.basename(event['screenshot'])
             dest_path = os.path.join(screenshots_dir, source_filename)
             
-            # Find the original full path of the frame
+            # Find the frame in the store
             frame_index = int(event['timestamp'] / SECONDS_PER_SAMPLE)
-            if 0 < frame_index < len(frame_files):
-                 source_frame_path = frame_files[frame_index]
-                 if os.path.exists(source_frame_path) and not os.path.exists(dest_path):
-                     shutil.copy(source_frame_path, dest_path)
+            if 0 < frame_index < len(frame_store):
+                 if not os.path.exists(dest_path):
+                     frame_store.export_jpeg(frame_index, dest_path)
             
             # Update the event to point to the final relative path
             event['screenshot'] = os.path.join("screenshots", source_filename)
@@ -45,14 +44,12 @@ def _save_event_screenshots(events, output_dir, frame_files):
 
         frame_index = int(event['timestamp'] / SECONDS_PER_SAMPLE)
 
-        if 0 < frame_index < len(frame_files):
-            source_frame_path = frame_files[frame_index]
-            
+        if 0 < frame_index < len(frame_store):
             screenshot_filename = f"event_at_{event['timestamp']:.0f}s_{event['eventType']}.jpg"
             dest_path = os.path.join(screenshots_dir, screenshot_filename)
             
             try:
-                shutil.copy(source_frame_path, dest_path)
+                frame_store.export_jpeg(frame_index, dest_path)
                 event['screenshot'] = os.path.join("screenshots", screenshot_filename)
             except Exception as e:
                 print(f"Warning: Could not save screenshot for event at {event['timestamp']}s. Reason: {e}")
@@ -60,13 +57,13 @@ def _save_event_screenshots(events, output_dir, frame_files):
         else:
              event['screenshot'] = None
 
-def format_and_save_output(raw_events, final_events, output_dir, frame_files):
+def format_and_save_output(raw_events, final_events, output_dir, frame_store):
     """
     Main entry point for the output formatter. 
     Saves screenshots and both the raw and final JSON logs.
     """
     # Screenshots are saved based on the final, consolidated events
-    _save_event_screenshots(final_events, output_dir, frame_files)
+    _save_event_screenshots(final_events, output_dir, frame_store)
     
     # Save the raw, unedited log for debugging
     raw_log_path = os.path.join(output_dir, "raw_llm_events.json")
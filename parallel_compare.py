@@ -0,0 +1,179 @@
+"""
+Parallel frame hashing and comparison.
+
+compare_frames decodes the frames of a FrameStore across a pool of worker
+processes and compares frame pairs (SSIM, pHash distance and the bounding
+box of the changed region). Frames are decoded window by window into a
+bounded multiprocessing.shared_memory block, downscaled with
+comparison_gray(), and workers read them straight from that block, so no
+frame array is pickled and memory does not grow with the recording length.
+The 64-bit pHash of every decoded frame is returned as well. It is taken from
+the full-resolution grayscale frame, exactly like frame_index.compute_phash,
+so it matches the estimator and the persisted pair index.
+
+The pool uses the 'spawn' start method, since the pipeline runs in processes
+that already have threads (the request scheduler, the worker service). It is
+created on first use and shared by every call.
+"""
+import atexit
+import itertools
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+import config
+from frame_index import hamming_distance, phash_from_gray
+from frame_store import FrameStore
+
+# One row per compared pair. Bounding boxes are in original frame pixels;
+# (-1, -1, -1, -1) means no pixel changed noticeably.
+COMPARISON_DTYPE = np.dtype([
+    ("prev", np.int32), ("current", np.int32),
+    ("ssim", np.float32), ("phash_distance", np.int16),
+    ("x0", np.int32), ("y0", np.int32), ("x1", np.int32), ("y1", np.int32),
+])
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _shared_pool():
+    """The worker pool shared by every call, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = multiprocessing.get_context("spawn").Pool(config.PARALLEL_COMPARE_WORKERS)
+            atexit.register(_pool.terminate)
+        return _pool
+
+def _run_tasks(func, tasks):
+    if config.PARALLEL_COMPARE_WORKERS <= 1:
+        return [func(task) for task in tasks]
+    return _shared_pool().map(func, tasks)
+
+def _chunks(items):
+    """Splits items into a few tasks per worker, so slow tasks do not hold up the others."""
+    count = max(1, config.PARALLEL_COMPARE_WORKERS) * 4
+    size = max(1, -(-len(items) // count))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def comparison_gray(gray):
+    """Downscales a grayscale frame to COMPARE_FRAME_WIDTH, the resolution SSIM is compared at."""
+    height, width = gray.shape
+    if width <= config.COMPARE_FRAME_WIDTH:
+        return gray
+    scale = config.COMPARE_FRAME_WIDTH / float(width)
+    return cv2.resize(gray, (config.COMPARE_FRAME_WIDTH, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+
+def _changed_pixels(first, second):
+    """Mask of the pixels of two comparison_gray() frames that differ noticeably."""
+    return cv2.absdiff(first, second) > config.COMPARE_DIFF_PIXEL_THRESHOLD
+
+def has_changed_pixels(prev_gray, current_gray):
+    """Whether any pixel differs noticeably between two grayscale frames, at comparison resolution."""
+    return bool(_changed_pixels(comparison_gray(prev_gray), comparison_gray(current_gray)).any())
+
+def _decode_slots(task):
+    """Decodes frames into their slots of the shared block and returns their pHashes."""
+    store_dir, shm_name, shape, assignments = task
+    store = FrameStore(store_dir, cache_size=0)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = None
+    try:
+        frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        hashes = []
+        for slot, i in assignments:
+            gray = store.get_array(i, grayscale=True)
+            frames[slot] = comparison_gray(gray)
+            hashes.append(phash_from_gray(gray))
+        return hashes
+    finally:
+        # Drop the array view before closing the block it points into
+        frames = None
+        shm.close()
+        store.close()
+
+def _compare_slots(task):
+    # Imported here so hashing and the analyze stage's start-up do not pay for scikit-image
+    from skimage.metrics import structural_similarity as ssim
+
+    shm_name, shape, scale, pairs = task
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = None
+    try:
+        frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        rows = np.zeros(len(pairs), dtype=COMPARISON_DTYPE)
+        for row, (a, b, slot_a, slot_b) in enumerate(pairs):
+            first, second = frames[slot_a], frames[slot_b]
+            changed = _changed_pixels(first, second)
+            points = cv2.findNonZero(changed.astype(np.uint8))
+            if points is None:
+                box = (-1, -1, -1, -1)
+            else:
+                x, y, w, h = cv2.boundingRect(points)
+                box = (int(x / scale), int(y / scale), int((x + w) / scale), int((y + h) / scale))
+            rows[row] = (a, b, ssim(first, second), 0) + box
+        return rows
+    finally:
+        frames = None
+        shm.close()
+
+def _windows(pairs, capacity):
+    """Groups pairs, in order, into batches whose frames fit into capacity slots."""
+    frames, batch = {}, []
+    for a, b in pairs:
+        needed = [i for i in (a, b) if i not in frames]
+        if len(frames) + len(needed) > capacity:
+            yield list(frames), batch
+            frames, batch = {}, []
+            needed = [a, b]
+        frames.update(dict.fromkeys(needed))
+        batch.append((a, b))
+    if batch:
+        yield list(frames), batch
+
+def compare_frames(frame_store, pairs=None):
+    """
+    Compares frame pairs of a FrameStore (adjacent pairs by default) in parallel.
+    Returns (frame_hashes, comparisons): the pHash of every frame as a list of
+    ints (None for frames no pair uses) and a COMPARISON_DTYPE array with one
+    row per pair, in pair order. At most PARALLEL_COMPARE_WINDOW_FRAMES
+    downscaled frames are held in shared memory at a time.
+    """
+    frame_hashes = [None] * len(frame_store)
+    if pairs is None:
+        pairs = [(i, i + 1) for i in range(len(frame_store) - 1)]
+    if not pairs:
+        return frame_hashes, np.empty(0, dtype=COMPARISON_DTYPE)
+
+    first = frame_store.get_array(0, grayscale=True)
+    height, width = comparison_gray(first).shape
+    # SSIM's default 7x7 window needs frames at least that large
+    if min(height, width) < 7:
+        raise ValueError(f"Frames of {first.shape[1]}x{first.shape[0]} are too small to compare.")
+    scale = width / float(first.shape[1])
+    capacity = max(2, config.PARALLEL_COMPARE_WINDOW_FRAMES)
+    shape = (capacity, height, width)
+
+    results = []
+    shm = shared_memory.SharedMemory(create=True, size=capacity * height * width)
+    try:
+        for window_frames, window_pairs in _windows(pairs, capacity):
+            assignments = list(enumerate(window_frames))
+            decoded = _run_tasks(_decode_slots, [(frame_store.directory, shm.name, shape, chunk)
+                                                 for chunk in _chunks(assignments)])
+            hashes = dict(zip(window_frames, itertools.chain.from_iterable(decoded)))
+            for i, frame_hash in hashes.items():
+                frame_hashes[i] = frame_hash
+            slots = {i: slot for slot, i in assignments}
+            rows = np.concatenate(_run_tasks(_compare_slots, [
+                (shm.name, shape, scale, [(a, b, slots[a], slots[b]) for a, b in chunk])
+                for chunk in _chunks(window_pairs)]))
+            rows["phash_distance"] = [hamming_distance(hashes[a], hashes[b]) for a, b in window_pairs]
+            results.append(rows)
+    finally:
+        shm.close()
+        shm.unlink()
+    return frame_hashes, np.concatenate(results)
@@ -6,6 +6,8 @@ import requests
 API_KEY = os.getenv("GEMINI_API_KEY")
 # Using a model that's good for text generation and summarization.
 MODEL_ENDPOINT = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key={API_KEY}"
+# Reused across calls so a long-running worker keeps its connection warm
+_session = requests.Session()
 
 def generate_step_by_step_report(final_events_json, audio_transcription, output_dir):
     """
@@ -56,7 +58,7 @@ Synthesize the information from both sources into a single, easy-to-follow instr
     }
 
     try:
-        response = requests.post(MODEL_ENDPOINT, json=payload, timeout=120)
+        response = _session.post(MODEL_ENDPOINT, json=payload, timeout=120)
         response.raise_for_status()
         
         response_json = response.json()
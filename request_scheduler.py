@@ -0,0 +1,255 @@
+"""
+Quota-aware scheduler for rate-limited API requests.
+
+Requests are queued by priority and dispatched to a thread pool while staying
+inside a requests-per-minute and a tokens-per-minute budget (token buckets).
+The number of requests in flight adapts additive-increase/multiplicative-
+decrease: it grows slowly while calls succeed quickly and is cut back on
+rate limiting (HTTP 429) or when latency exceeds its target. Transient
+failures are retried with backoff instead of being dropped.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class RateLimitError(Exception):
+    """Raised by a job when the API rejected the request for exceeding its quota."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransientRequestError(Exception):
+    """
+    Raised by a job for failures worth retrying (5xx responses, timeouts,
+    dropped connections). Subclasses may set retry_after to skip the backoff.
+    tokens_used, when known, corrects the token estimate like a job's return
+    value does, since a failed response may still have been billed.
+    """
+    retry_after = None
+    tokens_used = None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at rate_per_minute.
+    The level may go negative when actual usage exceeds an estimate; later
+    acquisitions then wait until the debt is paid back.
+    """
+
+    def __init__(self, rate_per_minute, burst_seconds=6.0):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1.0):
+        """Blocks until amount can be taken. Requests larger than the bucket wait for a full bucket."""
+        needed = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._level >= needed:
+                    self._level -= amount
+                    return
+                wait = (needed - self._level) / self.rate
+            time.sleep(min(wait, 1.0))
+
+    def adjust(self, amount):
+        """Gives back (positive) or charges extra (negative) tokens after the fact."""
+        with self._lock:
+            self._refill()
+            self._level = min(self.capacity, self._level + amount)
+
+
+class AIMDController:
+    """Additive-increase/multiplicative-decrease concurrency limit."""
+
+    def __init__(self, initial, minimum, maximum, target_latency=None,
+                 increase=1.0, decrease=0.5, cooldown_seconds=5.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown_seconds = cooldown_seconds
+        self._last_decrease = 0.0
+
+    def on_success(self, latency):
+        if self.target_latency and latency > self.target_latency:
+            self._back_off()
+        else:
+            # +increase per full window of successful requests
+            self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+
+    def on_throttle(self):
+        self._back_off()
+
+    def _back_off(self):
+        # A burst of 429s from one overload should only cut the limit once
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown_seconds:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.decrease)
+
+
+class _Job:
+    __slots__ = ("func", "priority", "tokens", "future", "attempts")
+
+    def __init__(self, func, priority, tokens):
+        self.func = func
+        self.priority = priority
+        self.tokens = tokens
+        self.future = Future()
+        self.attempts = 0
+
+
+class RequestScheduler:
+    """
+    Dispatches submitted jobs by priority within the configured budgets.
+
+    A job is a callable returning (value, tokens_used). tokens_used corrects
+    the token estimate given at submission; 0 means no request was made (for
+    example a cache hit) and refunds the job's budget. Jobs signal retryable
+    failures by raising RateLimitError or TransientRequestError; any other
+    exception fails the job's future immediately.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, min_concurrency=1,
+                 max_concurrency=8, initial_concurrency=2, target_latency=None, max_retries=5):
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self.controller = AIMDController(initial_concurrency, min_concurrency, max_concurrency, target_latency)
+        self.max_retries = max_retries
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm-request")
+        self._ready = []
+        self._delayed = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "throttled": 0,
+                      "retried": 0, "peak_concurrency": 0}
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="llm-scheduler", daemon=True)
+        self._dispatcher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def submit(self, func, priority=0, tokens=0):
+        """Queues a job. Lower priority values are dispatched first. Returns a Future."""
+        job = _Job(func, priority, tokens)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scheduler is closed.")
+            heapq.heappush(self._ready, (priority, next(self._sequence), job))
+            self.stats["submitted"] += 1
+            self._cond.notify_all()
+        return job.future
+
+    def close(self, wait=True):
+        """Stops accepting jobs; with wait=True, blocks until every queued job has finished."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            self._dispatcher.join()
+            self._executor.shutdown(wait=True)
+
+    def _promote_delayed(self):
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, sequence, job = heapq.heappop(self._delayed)
+            heapq.heappush(self._ready, (job.priority, sequence, job))
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                self._promote_delayed()
+                if self._closed and not self._ready and not self._delayed and self._active == 0:
+                    return
+                if not self._ready or self._active >= int(self.controller.limit):
+                    timeout = 0.5
+                    if self._delayed:
+                        timeout = min(timeout, max(0.0, self._delayed[0][0] - time.monotonic()))
+                    self._cond.wait(timeout)
+                    continue
+                _, _, job = heapq.heappop(self._ready)
+                self._active += 1
+                self.stats["peak_concurrency"] = max(self.stats["peak_concurrency"], self._active)
+
+            # Only this thread takes from the buckets, so waiting here keeps dispatch in priority order
+            self._requests.acquire(1)
+            self._tokens.acquire(job.tokens)
+            self._executor.submit(self._run, job)
+
+    def _retry(self, job, error, delay):
+        """Schedules another attempt of a job. Returns False once its retries are used up."""
+        job.attempts += 1
+        if job.attempts > self.max_retries:
+            self.stats["failed"] += 1
+            job.future.set_exception(error)
+            return False
+        self.stats["retried"] += 1
+        heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._sequence), job))
+        return True
+
+    def _run(self, job):
+        start = time.monotonic()
+        try:
+            value, tokens_used = job.func()
+        except RateLimitError as e:
+            delay = e.retry_after if e.retry_after is not None else (2 ** job.attempts) + random.uniform(0, 1)
+            with self._cond:
+                self.stats["throttled"] += 1
+                self.controller.on_throttle()
+                retrying = self._retry(job, e, delay)
+            if retrying:
+                print(f"    [API Limit Reached] Rate limited. Retrying in {delay:.2f} seconds "
+                      f"(concurrency limit now {int(self.controller.limit)}).")
+        except TransientRequestError as e:
+            delay = getattr(e, "retry_after", None)
+            if delay is None:
+                delay = min(60.0, (2 ** job.attempts) + random.uniform(0, 1))
+            if e.tokens_used is not None:
+                self._tokens.adjust(job.tokens - e.tokens_used)
+            with self._cond:
+                retrying = self._retry(job, e, delay)
+            if retrying:
+                print(f"    [API Warning] Transient failure: {e}. Retrying in {delay:.2f} seconds.")
+        except Exception as e:
+            with self._cond:
+                self.stats["failed"] += 1
+            job.future.set_exception(e)
+        else:
+            latency = time.monotonic() - start
+            if tokens_used is not None:
+                self._tokens.adjust(job.tokens - tokens_used)
+            if tokens_used == 0:
+                self._requests.adjust(1)
+            else:
+                with self._cond:
+                    self.controller.on_success(latency)
+            with self._cond:
+                self.stats["completed"] += 1
+            job.future.set_result(value)
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
@@ -0,0 +1,115 @@
+"""
+Local scroll detection with phase correlation and dense optical flow.
+
+Both frames are downscaled to grayscale. Phase correlation estimates the
+global shift in a single FFT, which also covers scrolls far larger than the
+optical-flow search window. Farneback flow seeded with that shift then checks
+that the motion is coherent: enough of the moving pixels must travel along the
+same axis, in the same direction, for the pair to count as a scroll.
+Phase correlation is periodic, so a shift of more than half the frame comes
+back wrapped with the opposite sign. A shift is only trusted if it explains
+the frames better than its wrapped counterpart and stays well below half the
+frame; larger scrolls are left to the LLM.
+Everything is vectorized NumPy/OpenCV; no API call is made.
+"""
+import cv2
+import numpy as np
+
+import config
+
+def _downscale(gray):
+    height, width = gray.shape[:2]
+    scale = min(1.0, config.SCROLL_DETECTION_WIDTH / float(width))
+    if scale < 1.0:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    return gray, scale
+
+def _shift_residual(prev, current, shift_x, shift_y):
+    """Mean absolute difference over the overlap, if current is prev moved by the shift."""
+    height, width = prev.shape
+    dx, dy = int(round(shift_x)), int(round(shift_y))
+    if abs(dx) >= width or abs(dy) >= height:
+        return np.inf
+    moved = prev[max(0, -dy):height - max(0, dy), max(0, -dx):width - max(0, dx)]
+    observed = current[max(0, dy):height - max(0, -dy), max(0, dx):width - max(0, -dx)]
+    return float(cv2.absdiff(moved, observed).mean())
+
+def _is_unwrapped_shift(prev, current, shift_x, shift_y):
+    """Whether the phase-correlation shift beats every wrapped alternative and is small enough to trust."""
+    height, width = prev.shape
+    if abs(shift_x) > config.SCROLL_MAX_SHIFT_FRACTION * width or abs(shift_y) > config.SCROLL_MAX_SHIFT_FRACTION * height:
+        return False
+    residual = _shift_residual(prev, current, shift_x, shift_y)
+    wrapped_x = shift_x - np.sign(shift_x) * width
+    wrapped_y = shift_y - np.sign(shift_y) * height
+    for alternative in ((wrapped_x, shift_y), (shift_x, wrapped_y), (wrapped_x, wrapped_y)):
+        if _shift_residual(prev, current, *alternative) < residual:
+            return False
+    return True
+
+def detect_scroll(prev_gray, current_gray):
+    """
+    Classifies the motion between two grayscale frames of the same size.
+    Returns None unless it is confidently a scroll, otherwise a dict with
+    'direction' ('up', 'down', 'left', 'right'), 'distance_px' in original
+    resolution and 'dominance', the share of moving pixels that agree.
+    """
+    if prev_gray is None or current_gray is None or prev_gray.shape != current_gray.shape:
+        return None
+    prev_small, scale = _downscale(prev_gray)
+    current_small, _ = _downscale(current_gray)
+
+    (shift_x, shift_y), response = cv2.phaseCorrelate(prev_small.astype(np.float32), current_small.astype(np.float32))
+    if response < config.SCROLL_MIN_PHASE_RESPONSE:
+        return None
+    if not _is_unwrapped_shift(prev_small, current_small, shift_x, shift_y):
+        return None
+
+    initial_flow = np.empty(prev_small.shape + (2,), dtype=np.float32)
+    initial_flow[..., 0] = shift_x
+    initial_flow[..., 1] = shift_y
+    flow = cv2.calcOpticalFlowFarneback(
+        prev_small, current_small, initial_flow,
+        config.OPTICAL_FLOW_PYR_SCALE, config.OPTICAL_FLOW_LEVELS, config.OPTICAL_FLOW_WINSIZE,
+        config.OPTICAL_FLOW_ITERATIONS, config.OPTICAL_FLOW_POLY_N, config.OPTICAL_FLOW_POLY_SIGMA,
+        cv2.OPTFLOW_USE_INITIAL_FLOW)
+    dx = flow[..., 0]
+    dy = flow[..., 1]
+    magnitude = np.hypot(dx, dy)
+
+    # Static regions (fixed headers, blank areas) carry no information
+    moving = magnitude > 1.0
+    moving_fraction = moving.mean()
+    if moving_fraction < config.SCROLL_MIN_MOVING_FRACTION:
+        return None
+
+    vertical = abs(shift_y) >= abs(shift_x)
+    component = dy if vertical else dx
+    sign = np.sign(shift_y if vertical else shift_x)
+    if sign == 0:
+        return None
+    # A vector agrees if it points along the dominant axis and direction
+    cos_tolerance = np.cos(np.deg2rad(config.SCROLL_ANGLE_TOLERANCE_DEG))
+    agrees = moving & (component * sign >= cos_tolerance * magnitude)
+    dominance = agrees.sum() / float(moving.sum())
+    if dominance < config.SCROLL_DOMINANT_FLOW_THRESHOLD:
+        return None
+
+    distance_px = float(np.median(np.abs(component[agrees]))) / scale
+    if distance_px < config.SCROLL_MIN_DISTANCE_PX:
+        return None
+
+    # Content moving up means the user scrolled down, and vice versa
+    if vertical:
+        direction = "down" if sign < 0 else "up"
+    else:
+        direction = "right" if sign < 0 else "left"
+    return {"direction": direction, "distance_px": int(round(distance_px)), "dominance": round(float(dominance), 3)}
+
+def scroll_to_analysis(scroll):
+    """Formats a detected scroll like an LLM frame analysis result."""
+    return {
+        "action": "SCROLL",
+        "target": f"Scrolled {scroll['direction']} about {scroll['distance_px']} px",
+        "confidence": "High",
+    }
@@ -0,0 +1,177 @@
+"""
+Lightweight registry of the pipeline stages.
+
+Importing this module is cheap: every stage imports its heavy dependencies
+(OpenCV, requests, ...) inside the stage function, so only the stages that
+actually run pay for them. Stages share a plain dict context; a stage whose
+inputs are missing from the context loads them from the artifacts a previous
+run left in the output directory, which allows running a subset of stages.
+"""
+import json
+import os
+import time
+
+# name -> {"title": ..., "func": ...}, in pipeline order
+STAGES = {}
+
+def register_stage(name, title):
+    """Decorator registering a stage function under a name, in pipeline order."""
+    def decorator(func):
+        STAGES[name] = {"title": title, "func": func}
+        return func
+    return decorator
+
+def parse_stage_list(spec):
+    """
+    Parses a comma-separated --stages value into stage names in pipeline order.
+    'all' (or an empty value) selects every stage.
+    """
+    if not spec or spec.strip() == "all":
+        return list(STAGES)
+    requested = [name.strip() for name in spec.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(unknown)}. Available: {', '.join(STAGES)}")
+    return [name for name in STAGES if name in requested]
+
+def run_stages(names, context):
+    """Runs the named stages in order, recording per-stage wall time in the context."""
+    timings = context.setdefault("stage_timings", {})
+    positions = {name: i + 1 for i, name in enumerate(STAGES)}
+    for name in names:
+        stage = STAGES[name]
+        print(f"--- Stage {positions[name]}: {stage['title']} ---")
+        start = time.time()
+        stage["func"](context)
+        timings[name] = time.time() - start
+        print()
+    return context
+
+def _load_json(context, key, filename):
+    """Returns context[key], loading it from a JSON artifact of a previous run if needed."""
+    if key not in context:
+        path = os.path.join(context["output_dir"], filename)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Stage input '{key}' is missing and {path} does not exist. Run the earlier stages first.")
+        with open(path, "r") as f:
+            context[key] = json.load(f)
+    return context[key]
+
+def _save_json(context, filename, data):
+    """Writes a stage artifact so later runs can resume from this stage."""
+    path = os.path.join(context["output_dir"], filename)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=4)
+    return path
+
+def _frame_store(context):
+    if "frame_store" not in context:
+        from frame_store import FrameStore
+
+        frame_dir = os.path.join(context["output_dir"], "temp", "frames")
+        if not FrameStore.exists(frame_dir):
+            raise FileNotFoundError(f"No extracted frames found in {frame_dir}. Run the 'preprocess' stage first.")
+        context["frame_store"] = FrameStore(frame_dir)
+    return context["frame_store"]
+
+def close_resources(context):
+    """Releases resources opened by the stages (the memory-mapped frame store)."""
+    frame_store = context.pop("frame_store", None)
+    if frame_store is not None:
+        frame_store.close()
+
+def _audio_path(context):
+    if "audio_path" not in context:
+        path = os.path.join(context["output_dir"], "temp", "audio.wav")
+        context["audio_path"] = path if os.path.exists(path) else None
+    return context["audio_path"]
+
+
+@register_stage("preprocess", "Pre-processing Video")
+def preprocess_stage(context):
+    from video_processor import preprocess_video
+
+    frame_dir, audio_path, total_frames, frame_store = preprocess_video(context["video"], context["output_dir"])
+    context.update(frame_dir=frame_dir, audio_path=audio_path, total_frames=total_frames,
+                   frame_store=frame_store)
+    print("Video pre-processing complete.")
+
+@register_stage("analyze", "Analyzing Frames with Multimodal LLM")
+def analyze_stage(context):
+    import config
+    from frame_analysis import analyze_frame_sequence
+    from frame_index import FramePairIndex
+    from parallel_compare import compare_frames
+
+    # A long-running caller can share one index across jobs via the context
+    pair_index = context.get("pair_index")
+    if pair_index is None:
+        pair_index = FramePairIndex.load(config.PHASH_INDEX_PATH)
+    frame_store = _frame_store(context)
+    # Decode every frame once across all cores; the pixel-level comparison of
+    # adjacent pairs lets idle pairs skip the LLM
+    frame_hashes, comparisons = compare_frames(frame_store)
+    print(f"  -> Compared {len(comparisons)} adjacent frame pairs in parallel.")
+    # ... and one scheduler, so every job shares the same API budget
+    raw_events, stats = analyze_frame_sequence(frame_store, pair_index=pair_index,
+                                               scheduler=context.get("scheduler"),
+                                               mode=context.get("analysis_mode"),
+                                               frame_hashes=frame_hashes, comparisons=comparisons)
+    pair_index.save(config.PHASH_INDEX_PATH)
+    context["raw_events"] = raw_events
+    context["analysis_stats"] = stats
+    _save_json(context, "raw_llm_events.json", raw_events)
+    print(f"Analysis mode: {stats['mode']}. Reused {stats['reused_pairs']} analyses for recurring screens, "
+          f"sent {stats['requested_pairs']} pairs to the LLM. Scheduler totals: {stats['completed']} completed, "
+          f"{stats['throttled']} rate-limited, {stats['retried']} retried, peak concurrency {stats['peak_concurrency']}.")
+    print(f"Resolved without an LLM call: {stats['unchanged_pairs']} pairs without any pixel change, "
+          f"{stats['local_scrolls']} scrolls detected locally.")
+    print(f"Model responses failing schema validation: {stats['parse_failures']}/{stats['responses']} "
+          f"({stats['parse_failure_rate']:.1%}), each re-requested for its pair only.")
+    if stats["failed_pairs"]:
+        print(f"  [LLM Error] {len(stats['failed_pairs'])} frame pairs failed after retries and are missing from the log.")
+    print(f"LLM analysis complete. Found {len(raw_events)} raw events.")
+
+@register_stage("consolidate", "Consolidating Events")
+def consolidate_stage(context):
+    from event_processor import process_and_consolidate_events
+
+    raw_events = _load_json(context, "raw_events", "raw_llm_events.json")
+    context["final_events"] = process_and_consolidate_events(raw_events)
+    # Overwritten by the 'format' stage once narratives and screenshots are added
+    _save_json(context, "final_session_log.json", context["final_events"])
+    print(f"Consolidated into {len(context['final_events'])} final events.")
+
+@register_stage("transcribe", "Transcribing Audio")
+def transcribe_stage(context):
+    from audio_transcriber import transcribe_audio_file
+
+    # The function handles saving the file internally
+    context["transcription"] = transcribe_audio_file(_audio_path(context), context["output_dir"])
+    print("Audio transcription complete.")
+
+@register_stage("format", "Formatting Final JSON Logs")
+def format_stage(context):
+    from nl_generation import generate_narrative
+    from output_formatter import format_and_save_output
+
+    raw_events = _load_json(context, "raw_events", "raw_llm_events.json")
+    final_events = _load_json(context, "final_events", "final_session_log.json")
+    context["final_events"] = generate_narrative(final_events)
+    format_and_save_output(raw_events, context["final_events"], context["output_dir"], _frame_store(context))
+    print("JSON logs and screenshots saved.")
+
+@register_stage("report", "Generating Final Report")
+def report_stage(context):
+    from report_generator import generate_step_by_step_report
+
+    final_events = _load_json(context, "final_events", "final_session_log.json")
+    if "transcription" not in context:
+        transcription_path = os.path.join(context["output_dir"], "audio_transcription.txt")
+        if os.path.exists(transcription_path):
+            with open(transcription_path, "r") as f:
+                context["transcription"] = f.read()
+        else:
+            context["transcription"] = "No audio transcription available."
+    generate_step_by_step_report(final_events, context["transcription"], context["output_dir"])
+    print("Report generation complete.")
@@ -1,17 +1,16 @@
 import pytesseract
-from PIL import Image
 import speech_recognition as sr
 import os
 import difflib # <-- NEW IMPORT: To compare text between frames
 
-def ocr_frame(frame_path):
+def ocr_frame(frame):
     """
-    Performs OCR on a single frame to extract all visible text.
+    Performs OCR on a single decoded frame (NumPy array) to extract all visible text.
     """
     try:
-        return pytesseract.image_to_string(Image.open(frame_path)).strip()
+        return pytesseract.image_to_string(frame).strip()
     except Exception as e:
-        print(f"OCR Error on {frame_path}: {e}")
+        print(f"OCR Error: {e}")
         return ""
 
 def transcribe_audio(audio_path):
@@ -43,7 +42,7 @@ def transcribe_audio(audio_path):
         return "Audio present but offline transcription failed. (Requires pocketsphinx)"
 
 
-def process_text(frame_files, audio_path, action_events):
+def process_text(frame_store, audio_path, action_events):
     """
     Main function for the text capture module.
     NEW STRATEGY: Proactively compares OCR results between frames to find typed text.
@@ -64,14 +63,14 @@ def process_text(frame_files, audio_path, action_events):
     # 2. NEW: Frame-by-frame OCR diffing to detect typed text
     print("  -> Scanning frames for typed text...")
     prev_text = ""
-    for i, frame_path in enumerate(frame_files):
+    for i in range(len(frame_store)):
         timestamp = i * 5 / 1.0
         
         # We can sample frames to improve performance
         if i % 2 != 0: # Check every 2nd sampled frame
             continue
             
-        current_text = ocr_frame(frame_path)
+        current_text = ocr_frame(frame_store.get_array(i))
         
         if prev_text:
             # Use difflib to find what was ADDED to the text on screen
@@ -2,16 +2,21 @@ import cv2
 import os
 import subprocess
 
+from config import SECONDS_PER_SAMPLE
+from frame_store import FrameStore, FrameStoreWriter
+
 def _extract_frames(video_path, out_dir):
     """
     Internal function to extract frames using OpenCV.
     MODIFIED: Now samples frames based on time (seconds) rather than frame count.
+    Sampled frames are packed into a single FrameStore in out_dir.
     """
     print(f"Extracting frames from {os.path.basename(video_path)}...")
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         print(f"Error: Could not open video file {video_path}")
-        return 0, []
+        FrameStoreWriter(out_dir).close()
+        return 0, FrameStore(out_dir)
 
     fps = cap.get(cv2.CAP_PROP_FPS)
     if fps == 0:
@@ -19,29 +24,24 @@ def _extract_frames(video_path, out_dir):
         fps = 25
 
     # --- NEW: Smarter Sampling Logic ---
-    SECONDS_PER_SAMPLE = 2  # Extract one frame every 2 seconds
     frame_interval = int(fps * SECONDS_PER_SAMPLE)
     
-    frame_count = 0
-    sampled_files = []
+    with FrameStoreWriter(out_dir) as writer:
+        while True:
+            frame_id = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+            ret, frame = cap.read()
+            if not ret:
+                break
 
-    while True:
-        frame_id = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
-        ret, frame = cap.read()
-        if not ret:
-            break
+            # Extract the very first frame, and then every 'frame_interval' frames
+            if frame_id == 0 or frame_id % frame_interval == 0:
+                writer.append(frame)
+        frame_count = len(writer)
 
-        # Extract the very first frame, and then every 'frame_interval' frames
-        if frame_id == 0 or frame_id % frame_interval == 0:
-            frame_filename = os.path.join(out_dir, f"frame_{frame_count:04d}.jpg")
-            cv2.imwrite(frame_filename, frame)
-            sampled_files.append(frame_filename)
-            frame_count += 1
-    
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     cap.release()
     print(f"Successfully extracted {frame_count} sampled frames (one every {SECONDS_PER_SAMPLE} seconds).")
-    return total_frames, sampled_files
+    return total_frames, FrameStore(out_dir)
 
 def _extract_audio(video_path, out_dir):
     """Internal function to extract audio using FFmpeg."""
@@ -71,8 +71,8 @@ def preprocess_video(video_path, output_dir):
     frame_dir = os.path.join(temp_dir, "frames")
     os.makedirs(frame_dir, exist_ok=True)
     
-    total_frames, sampled_frame_files = _extract_frames(video_path, frame_dir)
+    total_frames, frame_store = _extract_frames(video_path, frame_dir)
     audio_path = _extract_audio(video_path, temp_dir)
     
-    return frame_dir, audio_path, total_frames, sampled_frame_files
+    return frame_dir, audio_path, total_frames, frame_store
 
@@ -0,0 +1,213 @@
+"""
+Long-running worker that processes submitted videos from a local job queue.
+
+Dependencies are imported once at startup, and the HTTP connection pools, the
+pHash pair index and the request scheduler (so its API budget) are shared by
+every job. Jobs are submitted and inspected over a small local HTTP API:
+
+    POST /jobs        {"video": "/path/to/video.mp4", "stages": "all",
+                       "analysis_mode": "hierarchical", "keep_temp_files": false}
+    GET  /jobs        status of every job
+    GET  /jobs/<id>   status and metrics of one job
+    GET  /health      queue depth and worker settings
+
+Run with: python worker_service.py --port 8765 --workers 2
+"""
+import argparse
+import importlib
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+from main import run_pipeline
+from stages import parse_stage_list
+
+# Imported at startup so no job pays for them
+WARM_MODULES = ["video_processor", "frame_store", "frame_analysis", "parallel_compare", "scroll_detection", "event_processor",
+                "audio_transcriber", "nl_generation", "output_formatter", "report_generator"]
+
+
+class JobQueue:
+    """In-memory job table and a pool running the pipeline with shared resources."""
+
+    def __init__(self, workers):
+        from frame_analysis import create_scheduler
+        from frame_index import FramePairIndex
+
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.shared = {
+            "pair_index": FramePairIndex.load(config.PHASH_INDEX_PATH),
+            "scheduler": create_scheduler(),
+        }
+
+    def submit(self, request):
+        if not isinstance(request, dict):
+            raise ValueError("Request body must be a JSON object.")
+        video = request.get("video")
+        if not isinstance(video, str) or not os.path.exists(video):
+            raise ValueError(f"Video file not found: {video}")
+        stages = request.get("stages", "all")
+        if not isinstance(stages, str):
+            raise ValueError("'stages' must be a comma-separated string.")
+        parse_stage_list(stages)
+        analysis_mode = request.get("analysis_mode")
+        if analysis_mode not in (None, "linear", "hierarchical"):
+            raise ValueError(f"Unknown analysis_mode '{analysis_mode}'.")
+
+        job_id = uuid.uuid4().hex[:12]
+        video_name = os.path.splitext(os.path.basename(video))[0]
+        job = {
+            "id": job_id,
+            "video": os.path.abspath(video),
+            "stages": stages,
+            "analysis_mode": analysis_mode,
+            "keep_temp_files": bool(request.get("keep_temp_files", False)),
+            "output_dir": os.path.join("output", f"{video_name}_{time.strftime('%Y%m%d_%H%M%S')}_{job_id}"),
+            "status": "queued",
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "metrics": {},
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        self._executor.submit(self._run, job_id)
+        return self.get(job_id)
+
+    def _run(self, job_id):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = "running"
+            job["started_at"] = time.time()
+        try:
+            context = run_pipeline(job["video"], output_dir=job["output_dir"], stages=job["stages"],
+                                   analysis_mode=job["analysis_mode"], keep_temp_files=job["keep_temp_files"],
+                                   shared=self.shared)
+            status, error = "succeeded", None
+        except Exception as e:
+            traceback.print_exc()
+            context, status, error = {}, "failed", f"{type(e).__name__}: {e}"
+        with self._lock:
+            job["status"] = status
+            job["error"] = error
+            job["finished_at"] = time.time()
+            job["metrics"] = self._metrics(job, context)
+
+    @staticmethod
+    def _metrics(job, context):
+        metrics = {
+            "queue_seconds": round(job["started_at"] - job["submitted_at"], 3),
+            "run_seconds": round(job["finished_at"] - job["started_at"], 3),
+            "stage_seconds": {name: round(seconds, 3) for name, seconds in context.get("stage_timings", {}).items()},
+        }
+        if "raw_events" in context:
+            metrics["raw_events"] = len(context["raw_events"])
+        if "final_events" in context:
+            metrics["final_events"] = len(context["final_events"])
+        stats = context.get("analysis_stats")
+        if stats:
+            metrics["analysis"] = {key: stats[key] for key in (
+                "mode", "requested_pairs", "reused_pairs", "unchanged_pairs", "local_scrolls", "responses",
+                "parse_failures", "parse_failure_rate")}
+            metrics["analysis"]["failed_pairs"] = len(stats["failed_pairs"])
+        return metrics
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def list(self):
+        with self._lock:
+            return [{key: job[key] for key in ("id", "video", "status", "submitted_at", "finished_at")}
+                    for job in self._jobs.values()]
+
+    def health(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"workers": self.workers, "jobs": counts,
+                "indexed_pairs": len(self.shared["pair_index"]),
+                "scheduler": dict(self.shared["scheduler"].stats,
+                                  concurrency_limit=int(self.shared["scheduler"].controller.limit))}
+
+
+def _make_handler(queue):
+    class JobRequestHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            data = json.dumps(body, indent=2).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = self.path.rstrip("/")
+            if path == "/health":
+                self._send(200, queue.health())
+            elif path == "/jobs":
+                self._send(200, queue.list())
+            elif path.startswith("/jobs/"):
+                job = queue.get(path[len("/jobs/"):])
+                if job:
+                    self._send(200, job)
+                else:
+                    self._send(404, {"error": "Unknown job id."})
+            else:
+                self._send(404, {"error": "Not found."})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                self._send(404, {"error": "Not found."})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                self._send(202, queue.submit(request))
+            except (ValueError, json.JSONDecodeError) as e:
+                self._send(400, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            print(f"  [Worker API] {self.address_string()} {format % args}")
+
+    return JobRequestHandler
+
+
+def serve(host, port, workers):
+    print("Warming up pipeline modules...")
+    start = time.time()
+    for module in WARM_MODULES:
+        importlib.import_module(module)
+    config.ensure_directories()
+    queue = JobQueue(workers)
+    print(f"Warm-up complete in {time.time() - start:.2f} seconds.")
+
+    server = ThreadingHTTPServer((host, port), _make_handler(queue))
+    print(f"SessionReplay worker listening on http://{host}:{port} with {workers} parallel job(s).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down worker...")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run SessionReplay as a long-running worker with a local job API.")
+    parser.add_argument("--host", default=config.WORKER_HOST, help="Interface to bind. Keep it local.")
+    parser.add_argument("--port", type=int, default=config.WORKER_PORT, help="Port of the job API.")
+    parser.add_argument("--workers", type=int, default=config.WORKER_PARALLEL_JOBS, help="Videos processed in parallel.")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)